@@ -0,0 +1,4 @@
+from .message_passing import MessagePassing, Graph_Generator, Graph_Discriminator
+from .gru import GRU, GRUCell
+from .geometry import pair_features
+from .mnist_csv import load_csv, build_cache, threshold
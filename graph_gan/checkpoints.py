@@ -0,0 +1,46 @@
+import torch
+import os
+from os import listdir
+from os.path import join
+import re
+
+# Checkpoints are dicts of state_dicts saved as <folder>/ckpt_<epoch>.pt
+# Only the last keep_last are kept, plus every keep_every-th epoch; keep_last <= 0 keeps everything
+
+
+def checkpoint_epochs(folder):
+    return sorted(int(f[len('ckpt_'):-len('.pt')]) for f in listdir(folder) if re.fullmatch(r'ckpt_\d+\.pt', f))
+
+
+def save_checkpoint(folder, epoch, state, keep_last=3, keep_every=0):
+    path = join(folder, 'ckpt_' + str(epoch) + '.pt')
+
+    # written to a temporary file and renamed so a crash mid-save can't leave a truncated checkpoint
+    torch.save(state, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+    if(keep_last <= 0):
+        return
+
+    for old_epoch in checkpoint_epochs(folder)[:-keep_last]:
+        if(keep_every > 0 and old_epoch % keep_every == 0):
+            continue
+        os.remove(join(folder, 'ckpt_' + str(old_epoch) + '.pt'))
+
+
+def latest_checkpoint(folder):
+    epochs = checkpoint_epochs(folder)
+    if(not len(epochs)):
+        return None
+    return join(folder, 'ckpt_' + str(epochs[-1]) + '.pt')
+
+
+def rng_state():
+    return {'torch': torch.get_rng_state(), 'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else []}
+
+
+def set_rng_state(state):
+    # rng states have to be cpu byte tensors whatever map_location the checkpoint was loaded with
+    torch.set_rng_state(state['torch'].cpu())
+    if(len(state['cuda']) and torch.cuda.is_available()):
+        torch.cuda.set_rng_state_all([s.cpu() for s in state['cuda']])
@@ -0,0 +1,34 @@
+import torch
+import os
+
+from .distributed import local_rank, local_world_size
+
+# Picks the device and sizes torch's thread pools, shared by every experiment's training script
+
+
+# device is e.g. 'cuda', 'cuda:1' or 'cpu' - plain 'cuda' picks a free gpu with setGPU, or this process's gpu with distributed
+# num_threads and num_interop_threads only apply on cpu, 0 means torch default
+def setup_device(device, num_threads=0, num_interop_threads=0, distributed=False):
+    device = torch.device(device)
+
+    if(device.type == 'cuda'):
+        if(distributed and device.index is None):
+            device = torch.device('cuda', local_rank())
+        elif(device.index is None):
+            import setGPU
+
+        if(device.index is not None):
+            torch.cuda.set_device(device)
+    else:
+        # size the thread pools to the cores given to this run, torch defaults to every core on the node
+        if(num_threads > 0):
+            torch.set_num_threads(num_threads)
+        elif(distributed):
+            # torchrun sets OMP_NUM_THREADS=1, the cores are split between this host's processes instead
+            torch.set_num_threads(max(1, os.cpu_count() // local_world_size()))
+        if(num_interop_threads > 0):
+            torch.set_num_interop_threads(num_interop_threads)
+
+    print("Device: " + str(device) + ", threads: " + str(torch.get_num_threads()))
+
+    return device
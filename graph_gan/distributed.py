@@ -0,0 +1,80 @@
+import torch
+import torch.distributed as dist
+import os
+
+# Data parallel training over the processes started by torchrun, on one host or several, with the gloo backend so it runs on cpu
+# The same command is run on every host, e.g. for 8 processes on each of 2 hosts:
+#   torchrun --nnodes=2 --nproc_per_node=8 --rdzv_backend=c10d --rdzv_endpoint=<first host>:29500 main.py <main.py's args>
+# Every process trains on its own share of each epoch and the gradients are averaged over all of them in backward,
+# only rank 0 writes figures, loss plots and checkpoints
+# Everything here also works without torchrun, as a single process of rank 0
+
+
+def init_distributed():
+    # torchrun gives the rank, world size and rendezvous address in the environment
+    dist.init_process_group('gloo')
+
+
+def cleanup_distributed():
+    if(is_distributed()):
+        dist.destroy_process_group()
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+
+def rank():
+    return dist.get_rank() if is_distributed() else 0
+
+
+def world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    return rank() == 0
+
+
+# rank and number of processes on this host
+def local_rank():
+    return int(os.environ.get('LOCAL_RANK', 0))
+
+
+def local_world_size():
+    return int(os.environ.get('LOCAL_WORLD_SIZE', 1))
+
+
+def barrier():
+    if(is_distributed()):
+        dist.barrier()
+
+
+def mean_over_processes(value):
+    # mean of a python number over all the processes
+    if(not is_distributed()):
+        return value
+
+    value = torch.tensor(float(value), dtype=torch.float64)
+    dist.all_reduce(value)
+    return value.item() / world_size()
+
+
+def broadcast_object(obj):
+    # rank 0's obj on every process, it has to be picklable
+    if(not is_distributed()):
+        return obj
+
+    objs = [obj]
+    dist.broadcast_object_list(objs, src=0)
+    return objs[0]
+
+
+def gather_objects(obj):
+    # list of every process's obj, indexed by rank
+    if(not is_distributed()):
+        return [obj]
+
+    objs = [None]*world_size()
+    dist.all_gather_object(objs, obj)
+    return objs
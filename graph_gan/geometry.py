@@ -0,0 +1,18 @@
+import torch
+
+# edge features of every (receiving node in xr, sending node in x) pair - the distance between them and, with int_diffs,
+# the sender's intensity minus the receiver's - as (batch_size, num_r, num_hits, 2 if int_diffs else 1)
+def pair_features(x, xr, coord_dims=2, int_diffs=False):
+    c = coord_dims
+
+    # cdist is a single kernel over all pairs instead of a broadcast difference tensor and a norm over it,
+    # its direct mode is exactly symmetric and 0 between a node and itself, with a 0 gradient there rather than nan,
+    # so no epsilon has to be added to the differences - the matrix multiplication mode loses too much precision
+    dists = torch.cdist(xr[:, :, :c], x[:, :, :c], compute_mode='donot_use_mm_for_euclid_dist').unsqueeze(3)
+
+    if(not int_diffs):
+        return dists
+
+    int_diffs = (x[:, :, c].unsqueeze(1) - xr[:, :, c].unsqueeze(2)).unsqueeze(3)
+    return torch.cat((dists, int_diffs), 3)
+
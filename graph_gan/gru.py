@@ -0,0 +1,53 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+class GRU(nn.Module):
+    def __init__(self, input_size, hidden_size, num_layers, dropout):
+        super(GRU, self).__init__()
+        self.input_size = input_size
+        self.hidden_size = hidden_size
+        self.num_layers = num_layers
+        self.dropout = dropout
+        self.layers = nn.ModuleList()
+
+        self.layers.append(GRUCell(input_size, hidden_size))
+        for i in range(num_layers - 1):
+            self.layers.append(GRUCell(hidden_size, hidden_size))
+
+    def forward(self, x, hidden):
+        # each layer's new hidden state is the next layer's input, they're stacked at the end instead of written into hidden in place
+        x = x.squeeze(1)
+        hy = []
+        for i, layer in enumerate(self.layers):
+            x = F.dropout(layer(x, hidden[i]), p = self.dropout)
+            hy.append(x)
+
+        return x.unsqueeze(1), torch.stack(hy)
+
+class GRUCell(nn.Module):
+
+    """
+    An implementation of GRUCell.
+
+    """
+
+    def __init__(self, input_size, hidden_size, bias=True):
+        super(GRUCell, self).__init__()
+        self.input_size = input_size
+        self.hidden_size = hidden_size
+        self.bias = bias
+        self.x2h = nn.Linear(input_size, 3 * hidden_size, bias=bias)
+        self.h2h = nn.Linear(hidden_size, 3 * hidden_size, bias=bias)
+        self.reset_parameters()
+
+    def reset_parameters(self):
+        for w in self.parameters():
+            w.data.uniform_(-0.1, 0.1)
+
+    def forward(self, x, hidden):
+        # single fused op for
+        # i_r, i_i, i_n = x2h(x).chunk(3, 1) and h_r, h_i, h_n = h2h(hidden).chunk(3, 1)
+        # resetgate = sigmoid(i_r + h_r), inputgate = sigmoid(i_i + h_i), newgate = tanh(i_n + resetgate * h_n)
+        # hy = newgate + inputgate * (hidden - newgate)
+        return torch.gru_cell(x, hidden, self.x2h.weight, self.h2h.weight, self.x2h.bias, self.h2h.bias)
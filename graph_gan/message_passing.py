@@ -0,0 +1,218 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
+
+from .gru import GRU
+from .geometry import pair_features
+
+# Message passing shared by the graph GAN generators and discriminators
+# Each iteration the edge network fe (fe1, fe2) is run on every (receiving node, sending node) pair - both nodes' features
+# plus the distance between them and optionally their intensity difference - the messages to each node are summed
+# and the node update fn (a GRU or MLP fn1, then fn2) gives the node's new features
+# The first coord_dims node features are its coordinates and, with int_diffs, the next one its intensity
+# With self_loops each node also sends itself a message (at distance 0), without them it only hears from the other nodes
+
+class MessagePassing(nn.Module):
+    def __init__(self, fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, iters, num_hits, dropout, alpha, hidden_node_size=64, int_diffs=False, gru=True, factorized=False, chunk_size=0, knn=0, checkpoint_iters=False, coord_dims=2, self_loops=True):
+        super(MessagePassing, self).__init__()
+        self.fe_hidden_size = fe_hidden_size
+        self.fe_out_size = fe_out_size
+        self.mp_hidden_size = mp_hidden_size
+        self.mp_num_layers = mp_num_layers
+        self.iters = iters
+        self.num_hits = num_hits
+        self.dropout = dropout
+        self.alpha = alpha
+        self.hidden_node_size = hidden_node_size
+        self.gru = gru
+
+        self.fe_in_size = 2*hidden_node_size+2 if int_diffs else 2*hidden_node_size+1
+        self.use_int_diffs = int_diffs
+        self.factorized = factorized
+        self.chunk_size = chunk_size
+        self.knn = knn
+        self.checkpoint_iters = checkpoint_iters
+        self.coord_dims = coord_dims # 0 gives every edge a distance of 0
+        self.self_loops = self_loops
+
+        self.fe1 = nn.Linear(self.fe_in_size, fe_hidden_size)
+        self.fe2 = nn.Linear(fe_hidden_size, fe_out_size)
+
+        if(self.gru):
+            self.fn1 = GRU(fe_out_size + hidden_node_size, mp_hidden_size, mp_num_layers, dropout)
+            self.fn2 = nn.Linear(mp_hidden_size, hidden_node_size)
+        else:
+            self.fn1 = nn.ModuleList()
+            self.fn1.append(nn.Linear(fe_out_size + hidden_node_size, mp_hidden_size))
+            for i in range(mp_num_layers-1):
+                self.fn1.append(nn.Linear(mp_hidden_size, mp_hidden_size))
+            self.fn2 = nn.Linear(mp_hidden_size, hidden_node_size)
+
+    # runs the message passing iterations on x of shape (batch_size, num_hits, hidden_node_size)
+    def propagate(self, x):
+        batch_size = x.shape[0]
+        hidden = self.initHidden(batch_size)
+
+        for i in range(self.iters):
+            # when training with checkpoint_iters only each iteration's inputs are kept, its edge activations are recomputed in backward
+            if(self.checkpoint_iters and torch.is_grad_enabled()):
+                x, hidden = checkpoint(self.iteration, x, hidden, batch_size, use_reentrant=False)
+            else:
+                x, hidden = self.iteration(x, hidden, batch_size)
+
+        return x
+
+    def iteration(self, x, hidden, batch_size):
+        A = self.aggregate(x, batch_size)
+
+        x = torch.cat((A, x), 2)
+        del A
+
+        x = x.view(batch_size*self.num_hits, 1, self.fe_out_size + self.hidden_node_size)
+
+        if(self.gru):
+            x, hidden = self.fn1(x, hidden)
+        else:
+            for i in range(self.mp_num_layers):
+                x = F.leaky_relu(self.fn1[i](x), negative_slope=self.alpha)
+
+        x = torch.tanh(self.fn2(x))
+        return x.view(batch_size, self.num_hits, self.hidden_node_size), hidden
+
+    def aggregate(self, x, batch_size):
+        if(self.knn > 0 and self.knn < self.num_hits):
+            return self.knnSum(x, batch_size)
+
+        if(self.chunk_size <= 0 or self.chunk_size >= self.num_hits):
+            return self.edgeSum(x, x, batch_size)
+
+        # messages are summed over receiving nodes chunk_size at a time; when training each chunk is checkpointed
+        # and recomputed in backward so only one chunk's chunk_size x num_hits edge activations are alive at once
+        A = []
+        for i, xr in enumerate(torch.split(x, self.chunk_size, 1)):
+            if(torch.is_grad_enabled()):
+                A.append(checkpoint(self.edgeSum, x, xr, batch_size, i*self.chunk_size, use_reentrant=False))
+            else:
+                A.append(self.edgeSum(x, xr, batch_size, i*self.chunk_size))
+
+        return torch.cat(A, 1)
+
+    # messages to the receiving nodes xr, which are nodes start to start + num_r of x
+    def edgeSum(self, x, xr, batch_size, start=0):
+        num_r = xr.shape[1]
+
+        geometry = pair_features(x, xr, self.coord_dims, self.use_int_diffs)
+
+        if(self.factorized):
+            A = self.fe1Factorized(x, xr, geometry)
+        else:
+            A = self.fe1(self.getA(x, xr, batch_size, geometry))
+
+        A = F.leaky_relu(A, negative_slope=self.alpha)
+        A = F.leaky_relu(self.fe2(A), negative_slope=self.alpha)
+        A = A.view(batch_size, num_r, self.num_hits, self.fe_out_size)
+
+        if(not self.self_loops):
+            receivers = torch.arange(start, start + num_r, device=x.device).unsqueeze(1)
+            A = A * (receivers != torch.arange(self.num_hits, device=x.device)).unsqueeze(2)
+
+        return torch.sum(A, 2)
+
+    def knnSum(self, x, batch_size):
+        c = self.coord_dims
+
+        src, dst = self.getEdgeIndex(x, batch_size)
+        x = x.reshape(batch_size*self.num_hits, self.hidden_node_size)
+
+        diffs = x[src, :c+1] - x[dst, :c+1]
+        dists = torch.norm(diffs[:, :c], dim=1).unsqueeze(1)
+
+        if(self.factorized):
+            W = self.fe1.weight
+            H = self.hidden_node_size
+            A = F.linear(x, W[:, :H], self.fe1.bias)[dst] + F.linear(x, W[:, H:2*H])[src] + dists*W[:, 2*H]
+            if(self.use_int_diffs):
+                A = A + diffs[:, c:c+1]*W[:, 2*H+1]
+        elif(self.use_int_diffs):
+            A = self.fe1(torch.cat((x[dst], x[src], dists, diffs[:, c:c+1]), 1))
+        else:
+            A = self.fe1(torch.cat((x[dst], x[src], dists), 1))
+
+        A = F.leaky_relu(A, negative_slope=self.alpha)
+        A = F.leaky_relu(self.fe2(A), negative_slope=self.alpha)
+
+        # a node is always among its own knn nearest nodes, without self loops that edge is dropped
+        if(not self.self_loops):
+            A = A * (src != dst).unsqueeze(1)
+
+        A = A.new_zeros(batch_size*self.num_hits, self.fe_out_size).index_add(0, dst, A)
+        return A.view(batch_size, self.num_hits, self.fe_out_size)
+
+    def getEdgeIndex(self, x, batch_size):
+        # edges from each node's knn nearest nodes in coordinate space (itself included, as in the fully connected graph)
+        # returned as (sender, receiver) indices into the batch flattened to batch_size*num_hits nodes
+        coords = x[:, :, :self.coord_dims].detach()
+        nbrs = torch.topk(torch.cdist(coords, coords), self.knn, dim=2, largest=False)[1]
+
+        offsets = (torch.arange(batch_size, device=x.device)*self.num_hits).view(batch_size, 1, 1)
+        src = (nbrs + offsets).view(-1)
+        dst = (torch.arange(self.num_hits, device=x.device).view(1, self.num_hits, 1) + offsets).expand(batch_size, self.num_hits, self.knn).reshape(-1)
+
+        return src, dst
+
+    # geometry is the (batch_size, num_r, num_hits, 1 or 2) pair_features of xr and x
+    def getA(self, x, xr, batch_size, geometry):
+        num_r = xr.shape[1]
+        x1 = xr.repeat(1, 1, self.num_hits).view(batch_size, num_r*self.num_hits, self.hidden_node_size)
+        x2 = x.repeat(1, num_r, 1)
+
+        A = torch.cat((x1, x2, geometry.reshape(batch_size, num_r*self.num_hits, -1)), 2)
+        return A.view(batch_size*num_r*self.num_hits, self.fe_in_size)
+
+    def fe1Factorized(self, x, xr, geometry):
+        # fe1 is linear so the node halves of each pair are projected once per node and broadcast over the pairs,
+        # only the distance/intensity difference columns are computed per pair - gives the same output as fe1(getA(x, xr))
+        W = self.fe1.weight
+        H = self.hidden_node_size
+
+        x1 = F.linear(xr, W[:, :H], self.fe1.bias).unsqueeze(2)
+        x2 = F.linear(x, W[:, H:2*H]).unsqueeze(1)
+
+        A = x1 + x2 + geometry[:, :, :, :1]*W[:, 2*H]
+
+        if(self.use_int_diffs):
+            A = A + geometry[:, :, :, 1:2]*W[:, 2*H+1]
+
+        return A.view(-1, self.fe_hidden_size)
+
+    def initHidden(self, batch_size):
+        return torch.zeros(self.mp_num_layers, batch_size*self.num_hits, self.mp_hidden_size, device=next(self.parameters()).device)
+
+class Graph_Generator(MessagePassing):
+    def __init__(self, node_size, fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, iters, num_hits, dropout, alpha, hidden_node_size=64, int_diffs=False, gru=True, factorized=False, chunk_size=0, knn=0, checkpoint_iters=False, coord_dims=2, self_loops=True):
+        super(Graph_Generator, self).__init__(fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, iters, num_hits, dropout, alpha, hidden_node_size=hidden_node_size, int_diffs=int_diffs, gru=gru, factorized=factorized, chunk_size=chunk_size, knn=knn, checkpoint_iters=checkpoint_iters, coord_dims=coord_dims, self_loops=self_loops)
+        self.node_size = node_size
+
+    # x is the (batch_size, num_hits, hidden_node_size) latent noise, the first node_size features of the output are the nodes
+    def forward(self, x):
+        x = self.propagate(x)
+        return x[:,:,:self.node_size]
+
+class Graph_Discriminator(MessagePassing):
+    def __init__(self, node_size, fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, iters, num_hits, dropout, alpha, hidden_node_size=64, wgan=False, int_diffs=False, gru=False, factorized=False, chunk_size=0, knn=0, checkpoint_iters=False, coord_dims=2, self_loops=True):
+        super(Graph_Discriminator, self).__init__(fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, iters, num_hits, dropout, alpha, hidden_node_size=hidden_node_size, int_diffs=int_diffs, gru=gru, factorized=factorized, chunk_size=chunk_size, knn=knn, checkpoint_iters=checkpoint_iters, coord_dims=coord_dims, self_loops=self_loops)
+        self.node_size = node_size
+        self.wgan = wgan
+
+    def forward(self, x):
+        x = F.pad(x, (0,self.hidden_node_size - self.node_size,0,0,0,0))
+        x = self.propagate(x)
+
+        # the mean of each node's first feature is the score
+        x = torch.mean(x[:,:,:1], 1)
+
+        if(self.wgan):
+            return x
+
+        return torch.sigmoid(x)
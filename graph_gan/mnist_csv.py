@@ -0,0 +1,91 @@
+import numpy as np
+import itertools
+import os
+
+# Reading and thresholding the MNIST csvs, shared by the mnist_gan_graph* experiments' graph_dataset_mnist.py
+
+
+def load_csv(path, chunk_rows=100000):
+    # converts the csv to a .npy file next to it on first use, reading it in chunks, then memory maps that
+    npy_file = path[:-len('.csv')] + '.npy'
+
+    if(not os.path.exists(npy_file)):
+        print("Converting " + path)
+        with open(path) as f:
+            # loadtxt skips blank lines, e.g. a trailing one, so only the others are counted
+            num_rows = sum(1 for line in f if line.strip())
+            f.seek(0)
+
+            out = None
+            i = 0
+            while(True):
+                lines = list(itertools.islice(f, chunk_rows))
+                if(not len(lines)):
+                    break
+
+                rows = np.loadtxt(lines, delimiter=',', dtype=np.float32, ndmin=2)
+                if(not len(rows)):
+                    continue
+
+                if(out is None):
+                    out = np.lib.format.open_memmap(npy_file + '.tmp', mode='w+', dtype=np.float32, shape=(num_rows, rows.shape[1]))
+                out[i:i+len(rows)] = rows
+                i += len(rows)
+
+        if(out is None):
+            raise ValueError(path + " has no rows")
+
+        out.flush()
+        del out
+        os.replace(npy_file + '.tmp', npy_file)
+
+    return np.load(npy_file, mmap_mode='r')
+
+
+def build_cache(data_folder, csv, cache_file, num_thresholded, intensities, num, chunk_rows=100000):
+    dataset = load_csv(data_folder + csv + '.csv')
+
+    print("MNIST CSV Loaded")
+    print(dataset.shape)
+
+    # mnist8m has its labels in a separate file, the other csvs have them in the first column
+    if(csv == 'mnist8m'):
+        labels = load_csv(data_folder + 'mnist8m.labels.csv')[:, 0]
+        first_col = 0
+    else:
+        labels = dataset[:, 0]
+        first_col = 1
+
+    rows = np.arange(len(dataset)) if num == -1 else np.nonzero(labels == num)[0]
+
+    print(len(rows))
+
+    if(not os.path.exists(data_folder + 'cache')):
+        os.mkdir(data_folder + 'cache')
+
+    out = np.lib.format.open_memmap(cache_file + '.tmp', mode='w+', dtype=np.float32, shape=(len(rows), num_thresholded, 3 if intensities else 2))
+
+    for i in range(0, len(rows), chunk_rows):
+        X_pre = (dataset[rows[i:i+chunk_rows], first_col:]-127.5)/255.0
+        out[i:i+chunk_rows] = threshold(X_pre, num_thresholded, intensities)
+
+    out.flush()
+    del out
+    os.replace(cache_file + '.tmp', cache_file)
+
+
+def threshold(X_pre, num_thresholded, intensities):
+    imrange = np.linspace(-0.5, 0.5, num=28, endpoint=False)
+
+    xs, ys = np.meshgrid(imrange, imrange)
+
+    xs = xs.reshape(-1)
+    ys = ys.reshape(-1)
+
+    # brightest num_thresholded pixels of every image in ascending intensity, a row-wise argsort keeps the same tie order as sorting each image separately
+    idx = np.argsort(X_pre, axis=1)[:, -num_thresholded:]
+
+    if(not intensities):
+        return np.stack((xs[idx], ys[idx]), axis=2)
+    else:
+        return np.stack((xs[idx], ys[idx], np.take_along_axis(X_pre, idx, axis=1)), axis=2)
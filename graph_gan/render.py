@@ -0,0 +1,53 @@
+import numpy as np
+from matplotlib.image import imsave
+import matplotlib.cm as cm
+
+# Draws generated graphs as images, every node of every graph at once
+
+
+# graphs are (num_graphs, num_nodes, 3) arrays of (x, y, intensity) with x, y in [0, im_px + node_r)
+# each node is a disc of radius node_r filled with its intensity, later nodes drawn over earlier ones
+# the (im_px + node_r) square is scaled down to tile_px so it isn't rasterized at full size
+def draw_graphs(graphs, node_r, im_px, tile_px=100):
+    num_graphs, num_nodes = graphs.shape[:2]
+    scale = tile_px / (im_px + node_r)
+    r = node_r * scale
+
+    # pixel offsets of a disc around its centre
+    d = np.arange(-int(np.ceil(r)), int(np.ceil(r)) + 1)
+    dy, dx = np.meshgrid(d, d, indexing='ij')
+    in_disc = dy**2 + dx**2 < r**2
+    dy = dy[in_disc]
+    dx = dx[in_disc]
+
+    rows = (graphs[:, :, 1] * scale).astype(int)[:, :, None] + dy
+    cols = (graphs[:, :, 0] * scale).astype(int)[:, :, None] + dx
+    ims = np.broadcast_to(np.arange(num_graphs)[:, None, None], rows.shape)
+    vals = np.broadcast_to(graphs[:, :, 2:3], rows.shape)
+
+    inside = (rows >= 0) & (rows < tile_px) & (cols >= 0) & (cols < tile_px)
+    pixels = ((ims * tile_px + rows) * tile_px + cols)[inside]
+    vals = vals[inside]
+
+    # pixels and vals are in graph, node order - numpy doesn't say which of the repeated indices of an assignment wins,
+    # so each pixel's last write is picked explicitly as its first occurrence in the reversed order
+    pixels, last = np.unique(pixels[::-1], return_index=True)
+
+    out = np.zeros(num_graphs * tile_px * tile_px)
+    out[pixels] = vals[::-1][last]
+
+    return out.reshape(num_graphs, tile_px, tile_px)
+
+
+# writes images as one grid png, each image scaled to its own max like imshow does
+def save_grid(path, ims, ncols=10, pad=4):
+    num_ims, h, w = ims.shape
+    nrows = -(-num_ims // ncols)
+
+    ims = ims / np.maximum(ims.max(axis=(1, 2), keepdims=True), 1e-12)
+    ims = np.pad(ims, ((0, nrows*ncols - num_ims), (pad, 0), (pad, 0)))
+
+    grid = ims.reshape(nrows, ncols, h + pad, w + pad).transpose(0, 2, 1, 3).reshape(nrows*(h + pad), ncols*(w + pad))
+    grid = np.pad(grid, ((0, pad), (0, pad)))
+
+    imsave(path, grid, cmap=cm.gray_r, vmin=0, vmax=1)
@@ -0,0 +1,58 @@
+import threading
+import queue
+import atexit
+import traceback
+
+# Writes epoch artifacts (sample figures, loss curves, models) on a background thread while the next epoch trains
+# Jobs should only be given snapshots - numpy arrays, copies of the loss lists and models - not anything training keeps changing
+# The queue is bounded so snapshots can't pile up if writing falls behind, and everything queued is written before exit
+
+class ArtifactWriter():
+    def __init__(self, max_queued=4):
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.error = None
+
+        # daemon so a stuck job can't hang exit, close() is registered with atexit to flush the queue instead
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+        atexit.register(self.close)
+
+    def run(self):
+        while(True):
+            job = self.queue.get()
+
+            if(job is None):
+                self.queue.task_done()
+                return
+
+            f, args = job
+            try:
+                f(*args)
+            except Exception as e:
+                traceback.print_exc()
+                self.error = e
+
+            self.queue.task_done()
+
+    # blocks if max_queued jobs are already waiting
+    def submit(self, f, *args):
+        self.check()
+        self.queue.put((f, args))
+
+    def flush(self):
+        self.queue.join()
+        self.check()
+
+    def close(self):
+        if(self.thread.is_alive()):
+            self.queue.put(None)
+            self.thread.join()
+
+        self.check()
+
+    def check(self):
+        if(self.error is not None):
+            error = self.error
+            self.error = None
+            raise RuntimeError("writing artifacts failed") from error
@@ -1,79 +1,109 @@
 import uproot
+import awkward as ak
 import numpy as np
 import h5py
 
-from os import listdir
+from multiprocessing import Pool
+from os import listdir, cpu_count
 from os.path import isfile, join
+import argparse
 
-rootfiles = ["HGCAL/" + f for f in listdir('HGCAL/') if isfile(join('HGCAL/', f))]
-num_thresholded = 100
+hit_feat_size = 4 # 3 coords + E
+inp_feat_size = 4 # 3 coords + E
+hit_feats = [0, 5, 6, 7] # rechit feature columns kept
 
-# event_file = "thresholded/events_xyz_" + str(num_thresholded) + ".bin"
-# energy_file = "thresholded/energies.csv"
-# in_particle_file = "thresholded/in_particle.csv"
 
-event_file = "thresholded/events_xyz_" + str(num_thresholded) + ".hdf5"
+def parse_args():
+    parser = argparse.ArgumentParser()
 
-evf = h5py.File(event_file, "a")
-events_dset = evf.create_dataset("events", (99728, num_thresholded, 4))
-inp_dset = evf.create_dataset("in_particle", (99728, 4))
+    parser.add_argument("--num-thresholded", type=int, default=100, help="number of highest energy hits kept per event")
+    parser.add_argument("--root-dir", type=str, default="HGCAL/", help="directory of the Delphes ROOT files")
+    parser.add_argument("--out-dir", type=str, default="thresholded/", help="directory the hdf5 file is written to")
+    parser.add_argument("--num-workers", type=int, default=0, help="number of files converted in parallel, 0 means one per core")
+    parser.add_argument("--chunk-events", type=int, default=1024, help="events per hdf5 chunk")
+    parser.add_argument("--compression", type=str, default="gzip", help="hdf5 compression filter, 'none' to disable")
 
-n = 0
-n_events = 0
-for f in rootfiles:
-    print(n)
-    # evf = open(event_file, "ab")
-    # enf = open(energy_file, "ab")
-    # ipf = open(in_particle_file, "ab")
+    return parser.parse_args()
 
-    # if(n == 2):
-    #     break
-    print(f)
+
+# keeps the num_thresholded highest energy hits of every event in ascending energy, events with fewer hits are zero padded at the front
+def threshold(hits, counts, num_thresholded):
+    num_events = len(counts)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    event_ids = np.repeat(np.arange(num_events), counts)
+
+    order = np.lexsort((hits[:, 0], event_ids))
+    hits = hits[order]
+
+    # position of each hit counted from the highest energy hit of its event
+    from_end = offsets[event_ids + 1] - 1 - np.arange(len(hits))
+    kept = from_end < num_thresholded
+
+    events = np.zeros((num_events, num_thresholded, hit_feat_size), dtype=np.float32)
+    events[event_ids[kept], num_thresholded - 1 - from_end[kept]] = hits[kept]
+
+    return events
+
+
+def convert_file(args):
+    f, num_thresholded = args
 
     file = uproot.open(f)
+    tree = file['Delphes;1']
+
+    sf = tree['simcluster_features'].array()
+    one_particle = ak.num(sf, axis=1) == 1
+
+    # each kept event's own simcluster, the old loop took sf[i] with i counting the kept events, so files made before
+    # this pair the showers with the wrong in_particle rows (and the sf[i] of multi-particle events) and need to be regenerated
+    in_particle = ak.to_numpy(sf[one_particle][:, 0]).astype(np.float32)
+
+    rf = tree['rechit_features'].array()[one_particle]
+    counts = ak.to_numpy(ak.num(rf, axis=1))
+    hits = ak.to_numpy(ak.flatten(rf, axis=1))[:, hit_feats]
+
+    return f, threshold(hits, counts, num_thresholded), in_particle
+
+
+def main(args):
+    rootfiles = sorted([args.root_dir + f for f in listdir(args.root_dir) if isfile(join(args.root_dir, f))])
+    num_workers = args.num_workers if args.num_workers > 0 else cpu_count()
+    compression = None if args.compression == 'none' else args.compression
 
-    sf = file['Delphes;1']['simcluster_features'].array()
+    event_file = args.out_dir + "events_xyz_" + str(args.num_thresholded) + ".hdf5"
 
-    one_particle_events = []
+    evf = h5py.File(event_file, "w")
 
-    i = 0
-    for sc in sf:
-        if(len(sc)==1):
-            one_particle_events.append(i)
-        i += 1
+    # resized as each file comes in so the total number of events doesn't have to be known
+    events_dset = evf.create_dataset("events", (0, args.num_thresholded, hit_feat_size), maxshape=(None, args.num_thresholded, hit_feat_size), dtype=np.float32, chunks=(args.chunk_events, args.num_thresholded, hit_feat_size), compression=compression)
+    inp_dset = evf.create_dataset("in_particle", (0, inp_feat_size), maxshape=(None, inp_feat_size), dtype=np.float32, chunks=(args.chunk_events, inp_feat_size), compression=compression)
 
-    num_events = len(one_particle_events)
+    # events of file i are events[file_offsets[i]:file_offsets[i+1]]
+    file_offsets = [0]
+    files = []
 
-    print("One Particle Events: %d" % len(one_particle_events))
+    with Pool(num_workers) as pool:
+        for f, events, in_particle in pool.imap(convert_file, [(f, args.num_thresholded) for f in rootfiles]):
+            n_events = file_offsets[-1]
+            num_events = len(events)
+            print("%d: %s, one particle events: %d" % (len(files), f, num_events))
 
-    rechit_features = file['Delphes;1']['rechit_features'].array()
-    events = np.zeros((len(one_particle_events), num_thresholded, 4))
-    in_particle_data = np.zeros((len(one_particle_events), 4))
+            events_dset.resize(n_events + num_events, axis=0)
+            inp_dset.resize(n_events + num_events, axis=0)
 
-    i = 0
-    for rf in rechit_features[one_particle_events]:
-        rfnp = np.array(rf)
-        start_index = 0 if rfnp.shape[0] > num_thresholded else num_thresholded - rfnp.shape[0]
-        events[i,start_index:] = rfnp[np.argsort(rfnp[:,0])][-num_thresholded:, [0,5,6,7]]
-        # energies[i] = sf[i][0][0]
-        in_particle_data[i] = sf[i][0]
-        i += 1
+            events_dset[n_events:n_events+num_events] = events
+            inp_dset[n_events:n_events+num_events] = in_particle
 
-    # print(events.reshape(-1, num_thresholded*4).shape)
-    # print(energies.shape)
-    # print(in_particle_data.shape)
+            file_offsets.append(n_events + num_events)
+            files.append(f)
 
-    # np.save(evf, events)#.reshape(-1, num_thresholded*4))
-    # np.savetxt(enf, energies)
-    # np.savetxt(ipf, in_particle_data)
+    evf.create_dataset("file_offsets", data=np.array(file_offsets, dtype=np.int64))
+    evf["file_offsets"].attrs["files"] = files
+    evf.close()
 
-    # evf.close()
-    # enf.close()
-    # ipf.close()
+    print("Total Events: %d" % file_offsets[-1])
 
-    events_dset[n_events:n_events+num_events] = events[:]
-    inp_dset[n_events:n_events+num_events] = in_particle_data[:]
-    n += 1
-    n_events += num_events
 
-evf.close()
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
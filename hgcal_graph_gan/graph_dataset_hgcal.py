@@ -1,17 +1,20 @@
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
 import h5py
+import math
 
 # Loads the HGCAL Graphical Dataset
 
+def data_file(num_thresholded, coords):
+    data_folder = "../hgcal_data/thresholded/"
+    coords = 'xyz_' if coords == 'cartesian' else ''
+    return data_folder + "events_" + coords + str(num_thresholded) + ".hdf5"
+
 class HGCALGraphDataset(Dataset):
     def __init__(self, num_thresholded, train=True, coords='cartesian'):
         test_limit = 10000
-        data_folder = "../hgcal_data/thresholded/"
-
-        coords = 'xyz_' if coords == 'cartesian' else ''
 
-        file = h5py.File(data_folder + "events_" + coords + str(num_thresholded) + ".hdf5", "r")
+        file = h5py.File(data_file(num_thresholded, coords), "r")
 
         if(train):
             self.events = file["events"][:]
@@ -32,3 +35,115 @@ class HGCALGraphDataset(Dataset):
 
     def __getitem__(self, idx):
         return (self.events[idx], self.inp[idx])
+
+# Streams batches of (events, in_particle) from the HDF5 file without loading it into memory
+# Contiguous chunks are read in a random order and shuffled together in a buffer of buffer_size events
+# Use with DataLoader(batch_size=None) since the batches are already made
+# With num_replicas > 1 each of the data parallel processes reads its own share of the chunks, call set_epoch before each epoch
+# Pass the DataLoader's num_workers too, each worker batches its own share of the chunks so it changes the number of batches
+
+class HGCALGraphStream(IterableDataset):
+    def __init__(self, num_thresholded, batch_size, train=True, coords='cartesian', buffer_size=8192, chunk_size=0, drop_last=False, rank=0, num_replicas=1, seed=0, num_workers=0):
+        test_limit = 10000
+
+        self.file_name = data_file(num_thresholded, coords)
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self.drop_last = drop_last
+
+        with h5py.File(self.file_name, "r") as file:
+            self.num_events = len(file["in_particle"]) if train else min(len(file["in_particle"]), test_limit)
+            # read whole hdf5 chunks if the file is chunked
+            if(chunk_size <= 0):
+                chunk_size = file["events"].chunks[0] if file["events"].chunks is not None else 1024
+
+        self.chunk_size = chunk_size
+        self.rank = rank
+        self.num_replicas = num_replicas
+        self.seed = seed
+        self.num_workers = num_workers
+        self.epoch = 0
+
+        print("Streaming " + self.file_name)
+        print(self.num_events)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        # each worker's leftover partial batch is yielded (or dropped) on its own, so the batches are counted per worker share
+        if(self.num_replicas > 1):
+            num_chunks = self.num_events // self.chunk_size // self.num_replicas
+            partial = 0
+        else:
+            num_chunks = math.ceil(self.num_events / self.chunk_size)
+            partial = self.num_events % self.chunk_size
+
+        num_workers = max(1, self.num_workers)
+        num_batches = 0
+        for w in range(num_workers):
+            num_events = len(range(w, num_chunks, num_workers)) * self.chunk_size
+            # the partial last chunk is always read last, see __iter__
+            if(partial > 0 and (num_chunks - 1) % num_workers == w):
+                num_events -= self.chunk_size - partial
+
+            num_batches += num_events // self.batch_size if self.drop_last else math.ceil(num_events / self.batch_size)
+
+        return num_batches
+
+    def __iter__(self):
+        starts = torch.arange(0, self.num_events, self.chunk_size)
+
+        # each worker reads its own share of the chunks, the chunk order is drawn from the loader's base seed so the workers agree on it
+        worker = get_worker_info()
+        if(self.num_replicas > 1):
+            # every process draws the same chunk order from the seed and epoch, only whole chunks are used and each process
+            # gets the same number of them so they all take the same number of steps
+            generator = torch.Generator().manual_seed(self.seed + self.epoch)
+            starts = starts[:self.num_events // self.chunk_size]
+            starts = starts[torch.randperm(len(starts), generator=generator)]
+            starts = starts[:len(starts) - len(starts) % self.num_replicas][self.rank::self.num_replicas]
+            if(worker is not None):
+                starts = starts[worker.id::worker.num_workers]
+        else:
+            # only the whole chunks are shuffled, the partial last one stays last so __len__ knows which worker gets it
+            num_full = self.num_events // self.chunk_size
+            generator = torch.Generator().manual_seed(worker.seed - worker.id) if worker is not None else None
+            starts = torch.cat([starts[:num_full][torch.randperm(num_full, generator=generator)], starts[num_full:]])
+            if(worker is not None):
+                starts = starts[worker.id::worker.num_workers]
+
+        events = []
+        inp = []
+        buffered = 0
+
+        with h5py.File(self.file_name, "r") as file:
+            for start in starts.tolist():
+                end = min(start + self.chunk_size, self.num_events)
+                events.append(torch.from_numpy(file["events"][start:end]).float())
+                inp.append(torch.from_numpy(file["in_particle"][start:end]).float())
+                buffered += end - start
+
+                if(buffered >= self.buffer_size):
+                    events, inp = self.shuffle(events, inp)
+                    num_full = (len(inp) // self.batch_size) * self.batch_size
+                    for i in range(0, num_full, self.batch_size):
+                        yield (events[i:i+self.batch_size], inp[i:i+self.batch_size])
+
+                    # the leftover partial batch is mixed into the next buffer
+                    events = [events[num_full:]]
+                    inp = [inp[num_full:]]
+                    buffered = len(inp[0])
+
+        if(buffered > 0):
+            events, inp = self.shuffle(events, inp)
+            for i in range(0, len(inp), self.batch_size):
+                if(self.drop_last and i + self.batch_size > len(inp)):
+                    break
+                yield (events[i:i+self.batch_size], inp[i:i+self.batch_size])
+
+    def shuffle(self, events, inp):
+        events = torch.cat(events)
+        inp = torch.cat(inp)
+        perm = torch.randperm(len(inp))
+        return events[perm], inp[perm]
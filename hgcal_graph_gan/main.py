@@ -2,8 +2,9 @@
 
 import torch
 from model import Graph_Generator, Graph_Discriminator
-from graph_dataset_hgcal import HGCALGraphDataset
-from torch.utils.data import DataLoader
+from graph_dataset_hgcal import HGCALGraphDataset, HGCALGraphStream
+from torch.utils.data import DataLoader, DistributedSampler
+from torch.nn.parallel import DistributedDataParallel
 from torch.distributions.normal import Normal
 from torch.autograd import Variable
 from torch.autograd import grad as torch_grad
@@ -11,24 +12,41 @@ from torch.autograd import grad as torch_grad
 import torch.optim as optim
 from tqdm import tqdm
 
-import matplotlib.pyplot as plt
-plt.switch_backend('agg')
+from matplotlib.figure import Figure
 # import matplotlib.cm as cm
-#
-# import numpy as np
+
+import numpy as np
 
 import os
 from os import listdir
-from os.path import join, isdir
+from os.path import join, isdir, dirname, abspath
 import sys
+import copy
+
+sys.path.append(dirname(dirname(abspath(__file__))))
 
-torch.cuda.set_device(0)
+from graph_gan.writer import ArtifactWriter
+from graph_gan.checkpoints import save_checkpoint, latest_checkpoint, rng_state, set_rng_state
+from graph_gan.device import setup_device
+from graph_gan.distributed import init_distributed, cleanup_distributed, rank, world_size, is_main_process, mean_over_processes, broadcast_object, gather_objects
 
-#Have to specify 'name' and 'start_epoch' if True
+#Resumes from the latest checkpoint in models/<name> if True
 LOAD_MODEL = False
 WGAN = False
 TRAIN = True
 COORDS = 'cartesian'
+STREAM = False # read the hdf5 file in chunks as it trains instead of loading it all into memory
+DEVICE = 'cuda:0' # or e.g. 'cuda', 'cpu' - plain 'cuda' picks a free gpu with setGPU
+NUM_THREADS = 0 # intra-op threads on cpu, 0 means torch default
+NUM_INTEROP_THREADS = 0 # inter-op threads on cpu, 0 means torch default
+DEBUG = False # anomaly detection, nan/inf checks on the losses and gradient norm logging, all slow
+PRECISION = 'fp32' # autocast precision of the forward passes - 'bf16' runs on cpu or cuda, 'fp16' is cuda only and uses loss scaling
+DISTRIBUTED = False # data parallel over the processes started by torchrun on one or several hosts, with gloo - see graph_gan/distributed.py, batch_size is per process
+
+if(DISTRIBUTED):
+    init_distributed()
+
+device = setup_device(DEVICE, NUM_THREADS, NUM_INTEROP_THREADS, distributed=DISTRIBUTED)
 
 hit_feat_size = 4 # 3 coords + E
 inp_feat_size = 4 # 3 coords + E
@@ -46,10 +64,18 @@ lr_gen = 0.00005
 num_critic = 1
 num_iters = 4
 hidden_node_size = 64
+chunk_size = 0 # receiving nodes per edge network chunk, 0 means all at once - set e.g. 25 for num_hits = 400
+knn = 0 # number of nearest hits each hit receives messages from, 0 means fully connected
+checkpoint_iters = False # recompute each message passing iteration in backward instead of keeping its edge activations
+self_loops = True # each hit also sends itself a message
 gp_weight = 10
 beta1 = 0.5
+keep_last = 3 # most recent checkpoints kept, older ones are deleted - 0 keeps all
+keep_every = 50 # checkpoints of every this many epochs are kept regardless
 
 batch_size = 64
+stream_buffer = 8192 # events shuffled together when streaming
+stream_workers = 0 # DataLoader worker processes reading the stream
 
 # if(WGAN and GRAPH_D):
 #     batch_size = 16
@@ -59,42 +85,58 @@ batch_size = 64
 #     batch_size = 64
 
 torch.manual_seed(4)
-torch.autograd.set_detect_anomaly(True)
+# anomaly detection records a traceback for every op and slows every step down, so it's only on in DEBUG
+torch.autograd.set_detect_anomaly(DEBUG)
 
 name = "2_train"
 
+# rank 0's models/ decides for every process, the other hosts might not share it
 onlydirs = [f for f in listdir('models/') if isdir(join('models/', f))]
-if (name in onlydirs):
+if (broadcast_object(name in onlydirs)):
     print("name already used")
     if(not LOAD_MODEL):
         sys.exit()
-else:
+elif(is_main_process()):
     os.mkdir('./losses/' + name)
     os.mkdir('./models/' + name)
 
 del onlydirs
 
-f = open("args/" + name + ".txt", "w+")
-f.write(str(locals()))
-f.close()
+if(is_main_process()):
+    f = open("args/" + name + ".txt", "w+")
+    f.write(str(locals()))
+    f.close()
 
 #Change to True !!
-X = HGCALGraphDataset(num_hits, train=TRAIN, coords=COORDS)
+if(STREAM):
+    X = HGCALGraphStream(num_hits, batch_size, train=TRAIN, coords=COORDS, buffer_size=stream_buffer, rank=rank(), num_replicas=world_size(), num_workers=stream_workers)
+    print("loading")
+    X_loaded = DataLoader(X, batch_size=None, num_workers=stream_workers, pin_memory=(device.type == 'cuda'))
+else:
+    X = HGCALGraphDataset(num_hits, train=TRAIN, coords=COORDS)
+    print("loading")
+    if(DISTRIBUTED):
+        # each process gets its own shuffled share of every epoch, padded so they all take the same number of D and G steps
+        X_loaded = DataLoader(X, sampler=DistributedSampler(X, shuffle=True, seed=4), batch_size=batch_size, pin_memory=(device.type == 'cuda'))
+    else:
+        X_loaded = DataLoader(X, shuffle=True, batch_size=batch_size, pin_memory=(device.type == 'cuda'))
 
-print("loading")
+print("loaded")
 
-X_loaded = DataLoader(X, shuffle=True, batch_size=batch_size)
+G = Graph_Generator(hit_feat_size, inp_feat_size, fe_hidden_size, fe_out_size, gru_hidden_size, gru_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, hidden_node_size=hidden_node_size, coords=COORDS, chunk_size=chunk_size, knn=knn, checkpoint_iters=checkpoint_iters, self_loops=self_loops).to(device)
+D = Graph_Discriminator(node_size, fe_hidden_size, fe_out_size, gru_hidden_size, gru_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, hidden_node_size=hidden_node_size, coords=COORDS, chunk_size=chunk_size, knn=knn, checkpoint_iters=checkpoint_iters, self_loops=self_loops).to(device)
 
-print("loaded")
+if(DISTRIBUTED):
+    # the models start out the same on every process, after that each process draws its own noise and dropout masks
+    torch.manual_seed(4 + rank())
 
-if(LOAD_MODEL):
-    start_epoch = 255
-    G = torch.load("models/" + name + "/G_" + str(start_epoch) + ".pt")
-    D = torch.load("models/" + name + "/D_" + str(start_epoch) + ".pt")
+    # gradients through G_parallel and D_parallel are averaged over the processes in backward,
+    # G and D are the same models used directly when a step doesn't update them and for checkpoints
+    G_parallel = DistributedDataParallel(G)
+    D_parallel = DistributedDataParallel(D)
 else:
-    start_epoch = 0
-    G = Graph_Generator(hit_feat_size, inp_feat_size, fe_hidden_size, fe_out_size, gru_hidden_size, gru_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, hidden_node_size=hidden_node_size, coords=COORDS).cuda()
-    D = Graph_Discriminator(node_size, fe_hidden_size, fe_out_size, gru_hidden_size, gru_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, hidden_node_size=hidden_node_size, coords=COORDS).cuda()
+    G_parallel = G
+    D_parallel = D
 
 if(WGAN):
     G_optimizer = optim.RMSprop(G.parameters(), lr = lr_gen)
@@ -103,6 +145,50 @@ else:
     G_optimizer = optim.Adam(G.parameters(), lr = lr_gen, betas=(beta1, 0.999))
     D_optimizer = optim.Adam(D.parameters(), lr = lr_disc, betas=(beta1, 0.999))
 
+# bf16 autocast works on cpu and cuda without loss scaling, fp16 needs the gradients scaled so they don't underflow
+amp_dtype = {'fp32': None, 'bf16': torch.bfloat16, 'fp16': torch.float16}[PRECISION]
+D_scaler = torch.amp.GradScaler(device.type, enabled=(amp_dtype == torch.float16))
+G_scaler = torch.amp.GradScaler(device.type, enabled=(amp_dtype == torch.float16))
+
+def autocast():
+    return torch.autocast(device.type, dtype=amp_dtype, enabled=(amp_dtype is not None))
+
+D_losses = []
+G_losses = []
+
+start_epoch = 0
+if(LOAD_MODEL):
+    # only rank 0 reads the checkpoint and sends it to the other processes
+    checkpoint_file = None
+    state = None
+    if(is_main_process()):
+        checkpoint_file = latest_checkpoint("models/" + name)
+        if(checkpoint_file is not None):
+            state = torch.load(checkpoint_file, map_location='cpu' if DISTRIBUTED else device)
+
+    checkpoint_file, state = broadcast_object((checkpoint_file, state))
+
+    if(checkpoint_file is None):
+        print("no checkpoint to resume from in models/" + name)
+        sys.exit()
+
+    G.load_state_dict(state['G'])
+    D.load_state_dict(state['D'])
+    G_optimizer.load_state_dict(state['G_optimizer'])
+    D_optimizer.load_state_dict(state['D_optimizer'])
+    G_scaler.load_state_dict(state['G_scaler'])
+    D_scaler.load_state_dict(state['D_scaler'])
+
+    D_losses = state['D_losses']
+    G_losses = state['G_losses']
+    start_epoch = state['epoch']
+
+    # the checkpoint's rng state is restored so the resumed run carries on exactly where it was saved
+    # distributed checkpoints have every process's rng state
+    set_rng_state(state['rng'][rank()] if isinstance(state['rng'], list) else state['rng'])
+
+    print("resuming from " + checkpoint_file)
+
 normal_dist = Normal(0, 0.2)
 
 def wasserstein_loss(y_out, y_true):
@@ -113,50 +199,99 @@ if(WGAN):
 else:
     criterion = torch.nn.BCELoss()
 
-def gen(num_samples, inp, noise=0):
+def gen(num_samples, inp, noise=0, model=None):
     if(noise == 0):
-        noise = normal_dist.sample((num_samples, num_hits, hidden_node_size)).cuda()
+        noise = normal_dist.sample((num_samples, num_hits, hidden_node_size)).to(device)
+
+    if(model is None):
+        model = G
 
     x = noise
     del noise
 
-    x = G(x, inp)
+    x = model(x, inp)
     return x
 
+# loss plots and models are written on a background thread, only the snapshots are taken here
+writer = ArtifactWriter()
+
 def plot_loss(name, epoch, dlosses, glosses):
-    fig = plt.figure()
+    if(not is_main_process()):
+        return
+
+    writer.submit(write_loss_plot, name, epoch, list(dlosses), list(glosses))
+
+def write_loss_plot(name, epoch, dlosses, glosses):
+    # pyplot isn't thread safe, figures are made directly
+    fig = Figure()
     ax1 = fig.add_subplot(1, 2, 1)
     ax1.plot(dlosses)
     ax2 = fig.add_subplot(1, 2, 2)
     ax2.plot(glosses)
-    plt.show()
 
-    plt.savefig("losses/"+ name +"/"+ str(epoch) + ".png")
+    fig.savefig("losses/"+ name +"/"+ str(epoch) + ".png")
+
+# saved in each checkpoint so it's known which mode produced it
+run_info = {'debug': DEBUG, 'precision': PRECISION, 'device': str(device), 'torch': str(torch.__version__)}
 
 def save_models(name, epoch):
-    torch.save(G, "models/" + name + "/G_" + str(epoch) + ".pt")
-    torch.save(D, "models/" + name + "/D_" + str(epoch) + ".pt")
+    # a distributed checkpoint has every process's rng state, indexed by rank
+    rng = gather_objects(rng_state()) if DISTRIBUTED else rng_state()
+
+    if(not is_main_process()):
+        return
+
+    # everything is copied so training can carry on while the writer thread saves it
+    state = copy.deepcopy({
+        'epoch': epoch,
+        'G': G.state_dict(),
+        'D': D.state_dict(),
+        'G_optimizer': G_optimizer.state_dict(),
+        'D_optimizer': D_optimizer.state_dict(),
+        'G_scaler': G_scaler.state_dict(),
+        'D_scaler': D_scaler.state_dict(),
+        'rng': rng,
+        'D_losses': D_losses,
+        'G_losses': G_losses,
+        'run_info': run_info,
+    })
+
+    writer.submit(save_checkpoint, "models/" + name, epoch, state, keep_last, keep_every)
+
+D_grad_norms = []
+G_grad_norms = []
+
+# debug mode checks
+def check_finite(loss_name, loss):
+    if(not torch.isfinite(loss).all()):
+        raise RuntimeError(loss_name + " is " + str(loss.item()))
+
+def grad_norm(model):
+    return torch.norm(torch.stack([p.grad.detach().norm() for p in model.parameters() if p.grad is not None])).item()
 
 #from https://github.com/EmilienDupont/wgan-gp
 def gradient_penalty(real_data, generated_data):
         batch_size = real_data.size()[0]
 
         # Calculate interpolation
-        alpha = torch.rand(batch_size, 1, 1)
-        alpha = alpha.expand_as(real_data).cuda()
+        alpha = torch.rand(batch_size, 1, 1, device=device)
+        alpha = alpha.expand_as(real_data)
         interpolated = alpha * real_data.data + (1 - alpha) * generated_data.data
-        interpolated = Variable(interpolated, requires_grad=True).cuda()
+        interpolated = Variable(interpolated, requires_grad=True).to(device)
 
         del alpha
-        torch.cuda.empty_cache()
+        if(device.type == 'cuda'):
+            torch.cuda.empty_cache()
 
         # Calculate probability of interpolated examples
-        prob_interpolated = D(interpolated)
+        with autocast():
+            prob_interpolated = D(interpolated)
 
         # Calculate gradients of probabilities with respect to examples
-        gradients = torch_grad(outputs=prob_interpolated, inputs=interpolated, grad_outputs=torch.ones(prob_interpolated.size()).cuda(), create_graph=True, retain_graph=True, allow_unused=True)[0].cuda()
+        # with loss scaling the gradients are taken of the scaled output and unscaled after, the rest is done in fp32
+        gradients = torch_grad(outputs=D_scaler.scale(prob_interpolated.float()), inputs=interpolated, grad_outputs=torch.ones(prob_interpolated.size()).to(device), create_graph=True, retain_graph=True, allow_unused=True)[0].to(device)
 
-        gradients = gradients.contiguous()
+        gradients = gradients.float().contiguous() / D_scaler.get_scale()
 
         # Gradients have shape (batch_size, num_channels, img_width, img_height),
         # so flatten to easily take norm per example in batch
@@ -179,12 +314,15 @@ def train_D(x, inp):
     x = torch.cat((x[:,:,:hit_feat_size], inp[:]), 2)
 
     if(not WGAN):
-        Y_real = torch.ones(run_batch_size, 1).cuda()
-        Y_fake = torch.zeros(run_batch_size, 1).cuda()
+        Y_real = torch.ones(run_batch_size, 1).to(device)
+        Y_fake = torch.zeros(run_batch_size, 1).to(device)
 
-    D_real_output = D(x)
-    gen_ims = gen(run_batch_size, inp)
-    D_fake_output = D(gen_ims)
+    with autocast():
+        D_real_output = D_parallel(x).float()
+        # G isn't updated in this step so nothing is kept for its backward
+        with torch.no_grad():
+            gen_ims = gen(run_batch_size, inp)
+        D_fake_output = D_parallel(gen_ims).float()
 
     if(WGAN):
         D_loss = D_fake_output.mean() - D_real_output.mean() + gradient_penalty(x, gen_ims)
@@ -194,8 +332,17 @@ def train_D(x, inp):
 
         D_loss = D_real_loss + D_fake_loss
 
-    D_loss.backward()
-    D_optimizer.step()
+    if(DEBUG):
+        check_finite("D loss", D_loss)
+
+    D_scaler.scale(D_loss).backward()
+
+    if(DEBUG):
+        D_scaler.unscale_(D_optimizer)
+        D_grad_norms.append(grad_norm(D))
+
+    D_scaler.step(D_optimizer)
+    D_scaler.update()
 
     return D_loss.item()
 
@@ -206,44 +353,69 @@ def train_G(inp):
     run_batch_size = inp.shape[0]
 
     if(not WGAN):
-        Y_real = torch.ones(run_batch_size, 1).cuda()
+        Y_real = torch.ones(run_batch_size, 1).to(device)
 
     inp = inp.repeat(1, num_hits).view(run_batch_size, num_hits, inp_feat_size)
 
-    gen_ims = gen(run_batch_size, inp)
-
-    D_fake_output = D(gen_ims)
+    with autocast():
+        gen_ims = gen(run_batch_size, inp, model=G_parallel)
+        # D isn't updated in this step so its gradients aren't averaged over the processes
+        D_fake_output = D(gen_ims).float()
 
     if(WGAN):
         G_loss = -D_fake_output.mean()
     else:
         G_loss = criterion(D_fake_output, Y_real)
 
-    G_loss.backward()
-    G_optimizer.step()
+    if(DEBUG):
+        check_finite("G loss", G_loss)
 
-    return G_loss.item()
+    G_scaler.scale(G_loss).backward()
 
-D_losses = []
-G_losses = []
+    if(DEBUG):
+        G_scaler.unscale_(G_optimizer)
+        G_grad_norms.append(grad_norm(G))
+
+    G_scaler.step(G_optimizer)
+    G_scaler.update()
+
+    return G_loss.item()
 
 # save_models(name, 0)
 
 for i in range(start_epoch, 1000):
     print("Epoch %d" % (i+1))
+    if(STREAM):
+        X.set_epoch(i)
+    elif(DISTRIBUTED):
+        X_loaded.sampler.set_epoch(i)
+
     D_loss = 0
     G_loss = 0
-    for batch_ndx, x in tqdm(enumerate(X_loaded), total=len(X_loaded)):
+    num_batches = 0
+    for batch_ndx, x in tqdm(enumerate(X_loaded), total=len(X_loaded), disable=not is_main_process()):
         # print(x)
         if(batch_ndx > 0 and batch_ndx % (num_critic+1) == 0):
-            G_loss += train_G(x[1].cuda())
+            G_loss += train_G(x[1].to(device))
         else:
-            D_loss += train_D(x[0].cuda(), x[1].cuda())
+            D_loss += train_D(x[0].to(device), x[1].to(device))
+        num_batches += 1
 
-    D_losses.append(D_loss/len(X_loaded)/2)
-    G_losses.append(G_loss/len(X_loaded))
+    # every process keeps the loss history averaged over all of them, over the batches actually seen rather than len(X_loaded)
+    D_losses.append(mean_over_processes(D_loss)/num_batches/2)
+    G_losses.append(mean_over_processes(G_loss)/num_batches)
+
+    if(DEBUG):
+        print("D grad norm mean %.4g max %.4g" % (np.mean(D_grad_norms), np.max(D_grad_norms)))
+        if(len(G_grad_norms)):
+            print("G grad norm mean %.4g max %.4g" % (np.mean(G_grad_norms), np.max(G_grad_norms)))
+        D_grad_norms.clear()
+        G_grad_norms.clear()
 
     plot_loss(name, i+1, D_losses, G_losses)
 
     # if(i%5==4):
     save_models(name, i+1)
+
+writer.close()
+cleanup_distributed()
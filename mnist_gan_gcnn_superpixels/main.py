@@ -1,5 +1,3 @@
-import setGPU
-
 # from profile import profile
 # from time import sleep
 
@@ -11,25 +9,25 @@ from torch.distributions.normal import Normal
 from torch.autograd import Variable
 from torch.autograd import grad as torch_grad
 
-from skimage.draw import draw
-
 import torch.optim as optim
 from tqdm import tqdm
 
 import matplotlib.pyplot as plt
 plt.switch_backend('agg')
-import matplotlib.cm as cm
 
 import numpy as np
 
 import os
 from os import listdir
-from os.path import join, isdir
+from os.path import join, isdir, dirname, abspath
 import sys
 import tarfile
 import urllib
 
-torch.cuda.set_device(0)
+sys.path.append(dirname(dirname(abspath(__file__))))
+
+from graph_gan.render import draw_graphs, save_grid
+from graph_gan.device import setup_device
 
 url = 'http://ls7-www.cs.uni-dortmund.de/cvpr_geometric_dl/mnist_superpixels.tar.gz'
 
@@ -43,6 +41,13 @@ NUM = -1 #-1 means all numbers
 INT_DIFFS = True
 GRU = False
 
+DEVICE = 'cuda' # or e.g. 'cuda:1', 'cpu' - plain 'cuda' picks a free gpu with setGPU
+NUM_THREADS = 0 # intra-op threads on cpu, 0 means torch default
+NUM_INTEROP_THREADS = 0 # inter-op threads on cpu, 0 means torch default
+DEBUG = False # autograd anomaly detection, slow
+
+device = setup_device(DEVICE, NUM_THREADS, NUM_INTEROP_THREADS)
+
 node_feat_size = 3 # 2 coords + I
 #edge network params
 fe_hidden_size = 256
@@ -62,6 +67,10 @@ num_critic = 1
 num_iters = 1
 #latent vector size of each node (incl node feature size)
 hidden_node_size = 64
+#number of receiving nodes whose edge messages are computed at a time (0 means all at once)
+chunk_size = 0
+#whether each node also sends itself a message
+self_loops = True
 #wgan gradient penalty weight
 gp_weight = 10
 beta1 = 0.5
@@ -75,7 +84,7 @@ else:
 num_epochs = 2000
 
 torch.manual_seed(4)
-torch.autograd.set_detect_anomaly(True)
+torch.autograd.set_detect_anomaly(DEBUG)
 
 name = "58_lsgan_no_gru_all_nums"
 
@@ -116,7 +125,7 @@ f.close()
 print(name)
 
 #Change to True !!
-X = SuperpixelsDataset(num_hits, train=TRAIN, num=NUM)
+X = SuperpixelsDataset(num_hits, train=TRAIN, num=NUM, device=device)
 
 # print("loading")
 
@@ -126,12 +135,12 @@ X_loaded = DataLoader(X, shuffle=True, batch_size=batch_size)
 
 if(LOAD_MODEL):
     start_epoch = 1000
-    G = torch.load("models/" + name + "/G_" + str(start_epoch) + ".pt")
-    D = torch.load("models/" + name + "/D_" + str(start_epoch) + ".pt")
+    G = torch.load("models/" + name + "/G_" + str(start_epoch) + ".pt", map_location=device)
+    D = torch.load("models/" + name + "/D_" + str(start_epoch) + ".pt", map_location=device)
 else:
     start_epoch = 0
-    G = Graph_Generator(node_feat_size, fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, hidden_node_size=hidden_node_size, int_diffs=INT_DIFFS, gru=GRU).cuda()
-    D = Graph_Discriminator(node_feat_size, fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, hidden_node_size=hidden_node_size, int_diffs=INT_DIFFS, gru=GRU).cuda()
+    G = Graph_Generator(node_feat_size, fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, hidden_node_size=hidden_node_size, int_diffs=INT_DIFFS, gru=GRU, chunk_size=chunk_size, self_loops=self_loops).to(device)
+    D = Graph_Discriminator(node_feat_size, fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, hidden_node_size=hidden_node_size, int_diffs=INT_DIFFS, gru=GRU, chunk_size=chunk_size, self_loops=self_loops).to(device)
 
 if(WGAN):
     G_optimizer = optim.RMSprop(G.parameters(), lr = lr_gen)
@@ -157,7 +166,7 @@ else:
 
 def gen(num_samples, noise=0):
     if(noise == 0):
-        noise = normal_dist.sample((num_samples, num_hits, hidden_node_size)).cuda()
+        noise = normal_dist.sample((num_samples, num_hits, hidden_node_size)).to(device)
 
     x = noise
     del noise
@@ -165,49 +174,23 @@ def gen(num_samples, noise=0):
     x = G(x)
     return x
 
-def draw_graph(graph, node_r, im_px):
-    imd = im_px + node_r
-    img = np.zeros((imd, imd), dtype=np.float)
-
-    circles = []
-    for node in graph:
-        circles.append((draw.circle_perimeter(int(node[1]), int(node[0]), node_r), draw.circle(int(node[1]), int(node[0]), node_r), node[2]))
-
-    for circle in circles:
-        img[circle[1]] = circle[2]
-
-    return img
-
 def save_sample_outputs(name, epoch, dlosses, glosses):
-    fig = plt.figure(figsize=(10,10))
-
     num_ims = 100
     node_r = 30
     im_px = 1000
 
-    gen_out = gen(batch_size).cpu().detach().numpy()
-
-    for i in range(int(num_ims/batch_size)):
-        gen_out = np.concatenate((gen_out, gen(batch_size).cpu().detach().numpy()), 0)
-
-    gen_out = gen_out[:num_ims]
+    with torch.no_grad():
+        gen_out = gen(num_ims).cpu().numpy()
 
     gen_out[gen_out > 0.47] = 0.47
     gen_out[gen_out < -0.5] = -0.5
 
     gen_out = gen_out*[im_px, im_px, 1] + [(im_px+node_r)/2, (im_px+node_r)/2, 0.55]
 
-    for i in range(1, num_ims+1):
-        fig.add_subplot(10, 10, i)
-        im_disp = draw_graph(gen_out[i-1], node_r, im_px)
-        plt.imshow(im_disp, cmap=cm.gray_r, interpolation='nearest')
-        plt.axis('off')
+    save_grid("figs/" + name + "/" + str(epoch) + ".png", draw_graphs(gen_out, node_r, im_px))
 
     print("Epoch: " + str(epoch))
 
-    plt.savefig("figs/" +name + "/" + str(epoch) + ".png")
-    plt.close()
-
     fig = plt.figure()
     ax1 = fig.add_subplot(1, 2, 1)
     ax1.plot(dlosses)
@@ -228,19 +211,20 @@ def gradient_penalty(real_data, generated_data):
         batch_size = real_data.size()[0]
 
         # Calculate interpolation
-        alpha = torch.rand(batch_size, 1, 1)
-        alpha = alpha.expand_as(real_data).cuda()
+        alpha = torch.rand(batch_size, 1, 1, device=device)
+        alpha = alpha.expand_as(real_data)
         interpolated = alpha * real_data.data + (1 - alpha) * generated_data.data
-        interpolated = Variable(interpolated, requires_grad=True).cuda()
+        interpolated = Variable(interpolated, requires_grad=True).to(device)
 
         del alpha
-        torch.cuda.empty_cache()
+        if(device.type == 'cuda'):
+            torch.cuda.empty_cache()
 
         # Calculate probability of interpolated examples
         prob_interpolated = D(interpolated)
 
         # Calculate gradients of probabilities with respect to examples
-        gradients = torch_grad(outputs=prob_interpolated, inputs=interpolated, grad_outputs=torch.ones(prob_interpolated.size()).cuda(), create_graph=True, retain_graph=True, allow_unused=True)[0].cuda()
+        gradients = torch_grad(outputs=prob_interpolated, inputs=interpolated, grad_outputs=torch.ones(prob_interpolated.size()).to(device), create_graph=True, retain_graph=True, allow_unused=True)[0].to(device)
 
         gradients = gradients.contiguous()
 
@@ -262,8 +246,8 @@ def train_D(x):
     run_batch_size = x.shape[0]
 
     if(not WGAN):
-        Y_real = torch.ones(run_batch_size, 1).cuda()
-        Y_fake = torch.zeros(run_batch_size, 1).cuda()
+        Y_real = torch.ones(run_batch_size, 1).to(device)
+        Y_fake = torch.zeros(run_batch_size, 1).to(device)
 
     D_real_output = D(x)
     gen_ims = gen(run_batch_size)
@@ -290,7 +274,7 @@ def train_G():
     G_optimizer.zero_grad()
 
     if(not WGAN):
-        Y_real = torch.ones(batch_size, 1).cuda()
+        Y_real = torch.ones(batch_size, 1).to(device)
 
     gen_ims = gen(batch_size)
 
@@ -323,7 +307,7 @@ def train():
             if(batch_ndx > 0 and batch_ndx % (num_critic+1) == 0):
                 G_loss += train_G()
             else:
-                D_loss += train_D(x.cuda())
+                D_loss += train_D(x.to(device))
 
         D_losses.append(D_loss/len(X_loaded)/2)
         G_losses.append(G_loss/len(X_loaded))
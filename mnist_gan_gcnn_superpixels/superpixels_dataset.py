@@ -2,7 +2,7 @@ import torch
 from torch.utils.data import Dataset
 
 class SuperpixelsDataset(Dataset):
-    def __init__(self, num_thresholded, train=True, intensities=False, num=-1, mnist8m=False):
+    def __init__(self, num_thresholded, train=True, intensities=False, num=-1, mnist8m=False, device='cuda'):
         if(train):
             dataset = torch.load('dataset/training.pt')
         else:
@@ -22,7 +22,7 @@ class SuperpixelsDataset(Dataset):
 
         X = torch.cat((coords, ints.unsqueeze(2)), 2)
 
-        self.X = X.cuda()
+        self.X = X.contiguous().to(device)
 
         print(X.size())
 
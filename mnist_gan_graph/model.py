@@ -2,100 +2,40 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
-class Simple_GRU(nn.Module):
-    def __init__(self, node_size, fe_out_size, hidden_size, num_gru_layers, iters, num_hits, dropout, alpha, hidden_node_size=64):
-        super(Simple_GRU, self).__init__()
-        self.node_size = node_size
-        self.fe_out_size = fe_out_size
-        self.hidden_size = hidden_size
-        self.num_hits = num_hits
-        self.alpha = alpha
-        self.num_gru_layers = num_gru_layers
-        self.iters = iters
-        self.hidden_node_size = hidden_node_size
-
-        self.fe1 = nn.ModuleList()
-        self.fe2 = nn.ModuleList()
-        for i in range(iters):
-            self.fe1.append(nn.Linear(2*node_size + 1, 128))
-            self.fe2.append(nn.Linear(128, fe_out_size))
-
-        self.fn1 = GRU(fe_out_size + node_size, hidden_size, num_gru_layers, batch_first=True, dropout=dropout)
-        self.fn2 = nn.Linear(hidden_size, node_size)
-
-    def forward(self, x):
-        batch_size = x.shape[0]
-        hidden = self.initHidden(batch_size)
-
-        for i in range(self.iters):
-            x1 = x.repeat(1, 1, self.num_hits).view(batch_size, self.num_hits*self.num_hits, self.hidden_node_size)
-            x2 = x.repeat(1, self.num_hits, 1)
-
-            norms = torch.norm(x2[:, :, :2]-x1[:, :, :2], dim=2).unsqueeze(2)
-            pairs = torch.cat((x1, x2, norms), 2).view(batch_size*self.num_hits*self.num_hits, 2*self.hidden_node_size + 1)
-
-            del x1
-            del x2
-            del norms
-
-            av = F.leaky_relu(self.fe1(pairs), negative_slope=self.alpha)
-
-            del pairs
-
-            av = F.leaky_relu(self.fe2(av), negative_slope=self.alpha)
+# the shared graph GAN models are in graph_gan/ at the top of the repo
+import sys
+from os.path import dirname, abspath
+sys.path.append(dirname(dirname(abspath(__file__))))
 
-            av = torch.sum(av.view(batch_size, self.num_hits, self.num_hits, self.fe_out_size), 2)
-
-            x = torch.cat((av, x), 2)
-            del av
-
-            x = x.view(batch_size*self.num_hits, 1, self.fe_out_size + self.hidden_node_size)
-
-            x, hidden = self.fn1(x, hidden)
-            x = torch.tanh(self.fn2(x))
-            x = x.view(batch_size, self.num_hits, self.hidden_node_size)
+from graph_gan import Graph_Generator, Graph_Discriminator as MP_Discriminator
 
-        x = x[:,:,:self.node_size]
+# Simple_GRU and the same_params Graph_Discriminator are graph_gan's message passing models with a 128 wide edge network,
+# a GRU node update and distances over the first 2 node features
 
-        return x
-
-    def initHidden(self, batch_size):
-        return torch.zeros(self.num_gru_layers, batch_size*self.num_hits, self.hidden_size).cuda()
+class Simple_GRU(Graph_Generator):
+    def __init__(self, node_size, fe_out_size, hidden_size, num_gru_layers, iters, num_hits, dropout, alpha, hidden_node_size=64):
+        # the same edge network and GRU are used every iteration, on the hidden_node_size node vectors
+        super(Simple_GRU, self).__init__(node_size, 128, fe_out_size, hidden_size, num_gru_layers, iters, num_hits, dropout, alpha, hidden_node_size=hidden_node_size, gru=True)
 
-class Graph_Discriminator(nn.Module):
+class Graph_Discriminator(MP_Discriminator):
     def __init__(self, node_size, fe_out_size, hidden_size, num_gru_layers, iters, num_hits, dropout, alpha, same_params, hidden_node_size=64, wgan=False):
-        super(Graph_Discriminator, self).__init__()
-        self.node_size = node_size
-        self.hidden_node_size = hidden_node_size
-        self.fe_out_size = fe_out_size
-        self.num_hits = num_hits
-        self.alpha = alpha
-        self.dropout = dropout
+        super(Graph_Discriminator, self).__init__(node_size, 128, fe_out_size, hidden_size, num_gru_layers, iters, num_hits, dropout, alpha, hidden_node_size=hidden_node_size, wgan=wgan, gru=True)
         self.same_params = same_params
-        self.num_gru_layers = num_gru_layers
-        self.hidden_size = hidden_size
-        self.iters = iters
-        self.wgan = wgan
 
-        if(same_params):
-            # self.fe11 = nn.Linear(2*node_size + 1, 128)
-            # self.fe21 = nn.Linear(128, fe_out_size)
-            #
-            # self.fn11 = nn.Linear(fe_out_size + node_size, hidden_size)
-            # self.fn21 = nn.Linear(hidden_size, self.hidden_node_size-node_size)
-            #
-            # self.fe12 = nn.Linear(2*hidden_node_size + 1, 128)
-            # self.fe22 = nn.Linear(128, fe_out_size)
-            #
-            # self.fn12 = nn.GRU(fe_out_size + hidden_node_size, hidden_size, num_gru_layers, batch_first=True, dropout=dropout)
-            # self.fn22 = nn.Linear(hidden_size, 1)
-
-            self.fe1 = nn.Linear(2*hidden_node_size + 1, 128)
-            self.fe2 = nn.Linear(128, fe_out_size)
-
-            self.fn1 = GRU(fe_out_size + hidden_node_size, hidden_size, num_gru_layers, batch_first=True, dropout=dropout)
-            self.fn2 = nn.Linear(hidden_size, hidden_node_size)
-        else:
+        # self.fe11 = nn.Linear(2*node_size + 1, 128)
+        # self.fe21 = nn.Linear(128, fe_out_size)
+        #
+        # self.fn11 = nn.Linear(fe_out_size + node_size, hidden_size)
+        # self.fn21 = nn.Linear(hidden_size, self.hidden_node_size-node_size)
+        #
+        # self.fe12 = nn.Linear(2*hidden_node_size + 1, 128)
+        # self.fe22 = nn.Linear(128, fe_out_size)
+        #
+        # self.fn12 = nn.GRU(fe_out_size + hidden_node_size, hidden_size, num_gru_layers, batch_first=True, dropout=dropout)
+        # self.fn22 = nn.Linear(hidden_size, 1)
+
+        if(not same_params):
+            # a separate edge network and node update every iteration, the nodes grow from node_size to 16 then 32 features
             self.fe1 = nn.ModuleList()
             self.fe2 = nn.ModuleList()
 
@@ -123,9 +63,6 @@ class Graph_Discriminator(nn.Module):
             self.fn2.append(nn.Linear(128, 1))
 
     def forward(self, x):
-        batch_size = x.shape[0]
-        hidden = self.initHidden(batch_size)
-
         if(self.same_params):
             # x1 = x.repeat(1, 1, self.num_hits).view(batch_size, self.num_hits*self.num_hits, self.node_size)
             # x2 = x.repeat(1, self.num_hits, 1)
@@ -167,107 +104,65 @@ class Graph_Discriminator(nn.Module):
             #         y = F.dropout(F.tanh(self.fn22(y)), p=self.dropout)
             #         x = y.view(batch_size, self.num_hits)
 
-            # print(x)
-            x = F.pad(x, (0,self.hidden_node_size - self.node_size,0,0,0,0))
-            # print(x)
-
-            for i in range(self.iters):
-                x1 = x.repeat(1, 1, self.num_hits).view(batch_size, self.num_hits*self.num_hits, self.hidden_node_size)
-                x2 = x.repeat(1, self.num_hits, 1)
-
-                norms = torch.norm(x2[:, :, :2]-x1[:, :, :2], dim=2).unsqueeze(2)
-                pairs = torch.cat((x1, x2, norms), 2).view(batch_size*self.num_hits*self.num_hits, 2*self.hidden_node_size + 1)
+            return super(Graph_Discriminator, self).forward(x)
 
-                del x1
-                del x2
-                del norms
-
-                av = F.leaky_relu(self.fe1(pairs), negative_slope=self.alpha)
-
-                del pairs
-
-                av = F.leaky_relu(self.fe2(av), negative_slope=self.alpha)
-
-                av = torch.sum(av.view(batch_size, self.num_hits, self.num_hits, self.fe_out_size), 2)
-
-                x = torch.cat((av, x), 2)
-                del av
-
-                x = x.view(batch_size*self.num_hits, 1, self.fe_out_size + self.hidden_node_size)
-
-                # print(x)
-                # print(x.shape)
-
-                x, hidden = self.fn1(x, hidden)
-                x = torch.tanh(self.fn2(x))
-                x = x.view(batch_size, self.num_hits, self.hidden_node_size)
-
-            x = torch.mean(x[:,:,:1], 1)
-            # print(x)
-
-            if(self.wgan):
-                return x
-            return torch.sigmoid(x)
+        batch_size = x.shape[0]
 
-        else:
-            for i in range(self.iters):
-                x1 = x.repeat(1, 1, self.num_hits).view(batch_size, self.num_hits*self.num_hits, self.node_sizes[i])
-                x2 = x.repeat(1, self.num_hits, 1)
+        for i in range(self.iters):
+            x1 = x.repeat(1, 1, self.num_hits).view(batch_size, self.num_hits*self.num_hits, self.node_sizes[i])
+            x2 = x.repeat(1, self.num_hits, 1)
 
-                norms = torch.norm(x2[:, :, :2]-x1[:, :, :2], dim=2).unsqueeze(2)
-                av = torch.cat((x1, x2, norms), 2).view(batch_size*self.num_hits*self.num_hits, 2*self.node_sizes[i] + 1)
+            norms = torch.norm(x2[:, :, :2]-x1[:, :, :2], dim=2).unsqueeze(2)
+            av = torch.cat((x1, x2, norms), 2).view(batch_size*self.num_hits*self.num_hits, 2*self.node_sizes[i] + 1)
 
-                del x1
-                del x2
-                del norms
+            del x1
+            del x2
+            del norms
 
-                av = F.dropout(F.leaky_relu(self.fe1[i](av), negative_slope=self.alpha), p=self.dropout)
-                av = F.dropout(F.leaky_relu(self.fe2[i](av), negative_slope=self.alpha), p=self.dropout)
+            av = F.dropout(F.leaky_relu(self.fe1[i](av), negative_slope=self.alpha), p=self.dropout)
+            av = F.dropout(F.leaky_relu(self.fe2[i](av), negative_slope=self.alpha), p=self.dropout)
 
-                # av = F.dropout(torch.tanh(self.fe1[i](av)), p=self.dropout)
-                # av = F.dropout(torch.tanh(self.fe2[i](av)), p=self.dropout)
+            # av = F.dropout(torch.tanh(self.fe1[i](av)), p=self.dropout)
+            # av = F.dropout(torch.tanh(self.fe2[i](av)), p=self.dropout)
 
-                av = torch.sum(av.view(batch_size, self.num_hits, self.num_hits, self.fe_out_size), 2)
+            av = torch.sum(av.view(batch_size, self.num_hits, self.num_hits, self.fe_out_size), 2)
 
-                y = torch.cat((av, x), 2)
+            y = torch.cat((av, x), 2)
 
-                del av
+            del av
 
-                # y = F.dropout(F.leaky_relu(self.fn1[i](y), negative_slope=self.alpha), p=self.dropout)
-                # y = F.leaky_relu(self.fn2[i](y), negative_slope=self.alpha)
+            # y = F.dropout(F.leaky_relu(self.fn1[i](y), negative_slope=self.alpha), p=self.dropout)
+            # y = F.leaky_relu(self.fn2[i](y), negative_slope=self.alpha)
 
-                y = F.dropout(torch.tanh(self.fn1[i](y)), p=self.dropout)
-                y = torch.tanh(self.fn2[i](y))
+            y = F.dropout(torch.tanh(self.fn1[i](y)), p=self.dropout)
+            y = torch.tanh(self.fn2[i](y))
 
-                if(i<self.iters-1):
-                    y = y.view(batch_size, self.num_hits, self.node_sizes[i+1] - self.node_size)
-                    x = torch.cat((x[:,:,:2], y), 2)
-                else:
-                    x = y.view(batch_size, self.num_hits)
+            if(i<self.iters-1):
+                y = y.view(batch_size, self.num_hits, self.node_sizes[i+1] - self.node_size)
+                x = torch.cat((x[:,:,:2], y), 2)
+            else:
+                x = y.view(batch_size, self.num_hits)
 
         x = torch.sigmoid(torch.mean(x, 1, keepdim=True))
 
         return x
 
-    def initHidden(self, batch_size):
-        return torch.zeros(self.num_gru_layers, batch_size*self.num_hits, self.hidden_size).cuda()
-
 class Critic(nn.Module):
-    def __init__(self, input_shape, dropout, batch_size, wgan=False):
+    def __init__(self, input_shape, dropout, batch_size, wgan=False, sort_by=None):
         super(Critic, self).__init__()
         self.batch_size = batch_size
+        self.sort_by = sort_by # node features to order the nodes by before the convolutions, e.g. (0, 1, 2) for x then y then intensity, None to not sort
 
         self.leaky_relu = nn.LeakyReLU(negative_slope=0.2)
         self.max_pool = nn.MaxPool1d(2)
         self.conv1 = nn.Conv1d(input_shape[1], 32, 3, padding=1)
         self.conv2 = nn.Conv1d(32, 64, 3, padding=1)
-        self.out = nn.Linear(64*input_shape[0]/4, 1)
+        self.out = nn.Linear(64*(input_shape[0]//4), 1)
         self.wgan = wgan
         self.sigmoid = nn.Sigmoid()
 
     def forward(self, input):
-        # x = self.sort(input)
-        x = input
+        x = input if self.sort_by is None else self.sort(input)
         x = x.permute(0, 2, 1)
         x = self.max_pool(self.leaky_relu(self.conv1(x)))
         x = self.max_pool(self.leaky_relu(self.conv2(x)))
@@ -278,72 +173,14 @@ class Critic(nn.Module):
         else:
             return self.sigmoid(x)
 
+    # orders each graph's nodes by feature sort_by[0], ties broken by sort_by[1] and so on, for the whole batch at once
     def sort(self, x):
-        s, indx = torch.sort(x[:, :, 0])
-        for i in range(len(x)):
-            x[i] = x[i][indx[i]]
-        return x
-
-class GRU(nn.Module):
-    def __init__(self, input_size, hidden_size, num_layers, dropout):
-        super(GRUCell, self).__init__()
-        self.input_size = input_size
-        self.hidden_size = hidden_size
-        self.num_layers = num_layers
-        self.dropout = dropout
-        self.layers = nn.ModuleList()
-
-        self.layers.append(GRUCell(input_size, hidden_size))
-        for i in range(num_layers - 1):
-            self.layers.append(GRUCell(hidden_size, hidden_size))
-
-    def forward(self, x, hidden):
-        x = x.squeeze()
-        hidden[:, 0] = F.dropout(self.layers[0](x, hidden[:, 0]), p = self.dropout)
-
-        for i in range(1, self.num_layers):
-            hidden[:, i] = F.dropout(self.layers[i](hidden[:, i-1], hidden[:, i]), p = self.dropout)
-
-        return hidden[:, -1].unsqueeze(1), hidden
-
-class GRUCell(nn.Module):
-
-    """
-    An implementation of GRUCell.
-
-    """
-
-    def __init__(self, input_size, hidden_size, bias=True):
-        super(GRUCell, self).__init__()
-        self.input_size = input_size
-        self.hidden_size = hidden_size
-        self.bias = bias
-        self.x2h = nn.Linear(input_size, 3 * hidden_size, bias=bias)
-        self.h2h = nn.Linear(hidden_size, 3 * hidden_size, bias=bias)
-        self.reset_parameters()
-
-    def reset_parameters(self):
-        std = 1.0 / torch.sqrt(self.hidden_size)
-        for w in self.parameters():
-            w.data.uniform_(-std, std)
-
-    def forward(self, x, hidden):
-
-        x = x.view(-1, x.size(1))
-
-        gate_x = self.x2h(x)
-        gate_h = self.h2h(hidden)
-
-        gate_x = gate_x.squeeze()
-        gate_h = gate_h.squeeze()
-
-        i_r, i_i, i_n = gate_x.chunk(3, 1)
-        h_r, h_i, h_n = gate_h.chunk(3, 1)
+        indx = torch.arange(x.shape[1], device=x.device).expand(x.shape[0], -1)
 
-        resetgate = F.sigmoid(i_r + h_r)
-        inputgate = F.sigmoid(i_i + h_i)
-        newgate = F.tanh(i_n + (resetgate * h_n))
+        # stable sorts from the last key to the first, like np.lexsort
+        for f in reversed(self.sort_by):
+            keys = torch.gather(x[:, :, f], 1, indx)
+            indx = torch.gather(indx, 1, torch.sort(keys, dim=1, stable=True)[1])
 
-        hy = newgate + inputgate * (hidden - newgate)
+        return torch.gather(x, 1, indx.unsqueeze(2).expand(-1, -1, x.shape[2]))
 
-        return hy
@@ -1,57 +1,41 @@
 import torch
 from torch.utils.data import Dataset
 import numpy as np
+import os
 
-class MNISTGraphDataset(Dataset):
-    def __init__(self, num_thresholded, train=True, intensities=False, num=-1, mnist8m=False):
-        if(train):
-            if(mnist8m):
-                dataset = np.loadtxt('../mnist_dataset/mnist8m.csv', delimiter=',', dtype=np.float32)
-                labels = np.loadtxt('../mnist_dataset/mnist8m.labels.csv', delimiter=',', dtype=np.float32)
-            else:
-                dataset = np.loadtxt('../mnist_dataset/mnist_train.csv', delimiter=',', dtype=np.float32)
-        else:
-            dataset = np.loadtxt('../mnist_dataset/mnist_test.csv', delimiter=',', dtype=np.float32)
+import sys
+from os.path import dirname, abspath
+sys.path.append(dirname(dirname(abspath(__file__))))
 
-        print("MNIST CSV Loaded")
+from graph_gan import build_cache
 
-        print(dataset.shape)
+data_folder = '../mnist_dataset/'
 
-        if(num>-1):
-            if(mnist8m):
-                dataset = dataset[labels==num]
-            else:
-                dataset = dataset[dataset[:,0]==num]
-
-        print(dataset.shape)
-
-        if(mnist8m):
-            X_pre = (dataset-127.5)/255.0
+class MNISTGraphDataset(Dataset):
+    def __init__(self, num_thresholded, train=True, intensities=False, num=-1, mnist8m=False, device='cuda'):
+        if(train):
+            csv = 'mnist8m' if mnist8m else 'mnist_train'
         else:
-            X_pre = (dataset[:, 1:]-127.5)/255.0
-
-        imrange = np.linspace(-0.5, 0.5, num=28, endpoint=False)
-
-        xs, ys = np.meshgrid(imrange, imrange)
+            csv = 'mnist_test'
 
-        xs = xs.reshape(-1)
-        ys = ys.reshape(-1)
+        # the thresholded graphs are written once per (file, num_thresholded, intensities, num) and memory mapped on later runs
+        cache_file = data_folder + 'cache/' + '_'.join([csv, str(num_thresholded), 'intensities' if intensities else 'coords', str(num)]) + '.npy'
+        if(not os.path.exists(cache_file)):
+            build_cache(data_folder, csv, cache_file, num_thresholded, intensities, num)
 
-        self.X = np.array(list(map(lambda x: np.array([xs, ys, x]).T, X_pre)))
-
-        if(not intensities):
-            self.X = np.array(list(map(lambda x: x[x[:,2].argsort()][-num_thresholded:, :2], self.X)))
-        else:
-            self.X = np.array(list(map(lambda x: x[x[:,2].argsort()][-num_thresholded:], self.X)))
+        self.X = np.load(cache_file, mmap_mode='r')
 
-        self.X = torch.FloatTensor(self.X).cuda()
+        print("MNIST Graphs Loaded")
+        print(self.X.shape)
 
-        # print(self.X.shape)
-        # print(self.X[0])
-        # print("Data Processed")
+        # on cpu the graphs are read from the memory map as they're indexed so the dataset doesn't need to fit in RAM
+        if(torch.device(device).type == 'cuda'):
+            self.X = torch.from_numpy(np.array(self.X)).to(device)
 
     def __len__(self):
         return len(self.X)
 
     def __getitem__(self, idx):
+        if(isinstance(self.X, np.ndarray)):
+            return torch.from_numpy(np.array(self.X[idx]))
         return self.X[idx]
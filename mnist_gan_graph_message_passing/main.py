@@ -1,5 +1,3 @@
-import setGPU
-
 import torch
 from model import Simple_GRU, Critic, Graph_Discriminator
 from graph_dataset_mnist import MNISTGraphDataset
@@ -19,9 +17,13 @@ import numpy as np
 
 import os
 from os import listdir
-from os.path import isfile, join, isdir
+from os.path import isfile, join, isdir, dirname, abspath
 import sys
 
+sys.path.append(dirname(dirname(abspath(__file__))))
+
+from graph_gan.device import setup_device
+
 #Have to specify 'name' and 'start_epoch' if True
 LOAD_MODEL = False
 WGAN = False
@@ -32,6 +34,13 @@ INTENSITIES = True
 GRAPH_D = True
 SAME_PARAMS = True
 
+DEVICE = 'cuda' # or e.g. 'cuda:1', 'cpu' - plain 'cuda' picks a free gpu with setGPU
+NUM_THREADS = 0 # intra-op threads on cpu, 0 means torch default
+NUM_INTEROP_THREADS = 0 # inter-op threads on cpu, 0 means torch default
+DEBUG = False # autograd anomaly detection, slow
+
+device = setup_device(DEVICE, NUM_THREADS, NUM_INTEROP_THREADS)
+
 node_size = 3 if INTENSITIES else 2
 fe_out_size = 128
 gru_hidden_size = 128
@@ -45,6 +54,7 @@ lr_disc = 0.0001
 lr_gen = 0.00005
 num_critic = 1
 weight_clipping_limit = 0.1
+critic_sort_by = None # node features the Critic orders nodes by, e.g. (0, 1) for x then y, None to keep the generated order
 num_iters = 4
 hidden_node_size = 64
 gp_weight = 10
@@ -60,7 +70,7 @@ batch_size = 32
 #     batch_size = 64
 
 torch.manual_seed(4)
-torch.autograd.set_detect_anomaly(True)
+torch.autograd.set_detect_anomaly(DEBUG)
 
 name = "45_size_test"
 
@@ -81,21 +91,21 @@ f.write(str(locals()))
 f.close()
 
 #Change to True !!
-X = MNISTGraphDataset(num_hits, train=TRAIN, num=NUM, intensities=INTENSITIES, mnist8m=MNIST8M)
+X = MNISTGraphDataset(num_hits, train=TRAIN, num=NUM, intensities=INTENSITIES, mnist8m=MNIST8M, device=device)
 X_loaded = DataLoader(X, shuffle=True, batch_size=batch_size)
 
 if(LOAD_MODEL):
     start_epoch = 255
-    G = torch.load("models/" + name + "/G_" + str(start_epoch) + ".pt")
-    D = torch.load("models/" + name + "/D_" + str(start_epoch) + ".pt")
+    G = torch.load("models/" + name + "/G_" + str(start_epoch) + ".pt", map_location=device)
+    D = torch.load("models/" + name + "/D_" + str(start_epoch) + ".pt", map_location=device)
 else:
     start_epoch = 0
-    G = Simple_GRU(node_size, fe_out_size, gru_hidden_size, gru_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, SAME_PARAMS, hidden_node_size=hidden_node_size).cuda()
+    G = Simple_GRU(node_size, fe_out_size, gru_hidden_size, gru_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, SAME_PARAMS, hidden_node_size=hidden_node_size).to(device)
 
     if(GRAPH_D):
-        D = Graph_Discriminator(node_size, fe_out_size, gru_hidden_size, gru_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, SAME_PARAMS, hidden_node_size=hidden_node_size).cuda()
+        D = Graph_Discriminator(node_size, fe_out_size, gru_hidden_size, gru_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, SAME_PARAMS, hidden_node_size=hidden_node_size).to(device)
     else:
-        D = Critic((num_hits, node_size), dropout, batch_size, wgan=WGAN).cuda()
+        D = Critic((num_hits, node_size), dropout, batch_size, wgan=WGAN, sort_by=critic_sort_by).to(device)
 
 if(WGAN):
     G_optimizer = optim.RMSprop(G.parameters(), lr = lr_gen)
@@ -116,7 +126,7 @@ else:
 
 def gen(num_samples, noise=0):
     if(noise == 0):
-        noise = normal_dist.sample((num_samples, num_hits, hidden_node_size)).cuda()
+        noise = normal_dist.sample((num_samples, num_hits, hidden_node_size)).to(device)
 
     x = noise
     del noise
@@ -175,19 +185,20 @@ def gradient_penalty(real_data, generated_data):
         batch_size = real_data.size()[0]
 
         # Calculate interpolation
-        alpha = torch.rand(batch_size, 1, 1)
-        alpha = alpha.expand_as(real_data).cuda()
+        alpha = torch.rand(batch_size, 1, 1, device=device)
+        alpha = alpha.expand_as(real_data)
         interpolated = alpha * real_data.data + (1 - alpha) * generated_data.data
-        interpolated = Variable(interpolated, requires_grad=True).cuda()
+        interpolated = Variable(interpolated, requires_grad=True).to(device)
 
         del alpha
-        torch.cuda.empty_cache()
+        if(device.type == 'cuda'):
+            torch.cuda.empty_cache()
 
         # Calculate probability of interpolated examples
         prob_interpolated = D(interpolated)
 
         # Calculate gradients of probabilities with respect to examples
-        gradients = torch_grad(outputs=prob_interpolated, inputs=interpolated, grad_outputs=torch.ones(prob_interpolated.size()).cuda(), create_graph=True, retain_graph=True, allow_unused=True)[0].cuda()
+        gradients = torch_grad(outputs=prob_interpolated, inputs=interpolated, grad_outputs=torch.ones(prob_interpolated.size()).to(device), create_graph=True, retain_graph=True, allow_unused=True)[0].to(device)
 
         # print(gradients)
         # print(gradients.shape)
@@ -213,8 +224,8 @@ def train_D(x):
     D_optimizer.zero_grad()
 
     if(not WGAN):
-        Y_real = torch.ones(x.shape[0], 1).cuda()
-        Y_fake = torch.zeros(x.shape[0], 1).cuda()
+        Y_real = torch.ones(x.shape[0], 1).to(device)
+        Y_fake = torch.zeros(x.shape[0], 1).to(device)
 
     D_real_output = D(x)
     gen_ims = gen(x.shape[0])
@@ -242,7 +253,7 @@ def train_G():
     G_optimizer.zero_grad()
 
     if(not WGAN):
-        Y_real = torch.ones(batch_size, 1).cuda()
+        Y_real = torch.ones(batch_size, 1).to(device)
 
     gen_ims = gen(batch_size)
 
@@ -270,7 +281,7 @@ for i in range(start_epoch, 1000):
     D_loss = 0
     G_loss = 0
     for batch_ndx, x in tqdm(enumerate(X_loaded), total=len(X_loaded)):
-        x = x.cuda()
+        x = x.to(device)
         D_loss += train_D(x)
         if(batch_ndx > 0 and batch_ndx % num_critic == 0):
             G_loss += train_G()
@@ -1,45 +1,41 @@
 import torch
 from torch.utils.data import Dataset
 import numpy as np
+import os
 
-class MNISTGraphDataset(Dataset):
-    def __init__(self, num_thresholded, train=True, intensities=False, num=-1):
-        if(train):
-            dataset = np.loadtxt('../mnist_dataset/mnist_train.csv', delimiter=',', dtype=np.float32)
-        else:
-            dataset = np.loadtxt('../mnist_dataset/mnist_test.csv', delimiter=',', dtype=np.float32)
-
-        print("MNIST CSV Loaded")
-
-        if(num>-1):
-            dataset = dataset[dataset[:,0]==num]
-
-        print(dataset.shape)
+import sys
+from os.path import dirname, abspath
+sys.path.append(dirname(dirname(abspath(__file__))))
 
-        X_pre = (dataset[:, 1:]-127.5)/255.0
+from graph_gan import build_cache
 
-        imrange = np.linspace(-0.5, 0.5, num=28, endpoint=False)
+data_folder = '../mnist_dataset/'
 
-        xs, ys = np.meshgrid(imrange, imrange)
-
-        xs = xs.reshape(-1)
-        ys = ys.reshape(-1)
+class MNISTGraphDataset(Dataset):
+    def __init__(self, num_thresholded, train=True, intensities=False, num=-1, device='cuda'):
+        if(train):
+            csv = 'mnist_train'
+        else:
+            csv = 'mnist_test'
 
-        self.X = np.array(list(map(lambda x: np.array([xs, ys, x]).T, X_pre)))
+        # the thresholded graphs are written once per (file, num_thresholded, intensities, num) and memory mapped on later runs
+        cache_file = data_folder + 'cache/' + '_'.join([csv, str(num_thresholded), 'intensities' if intensities else 'coords', str(num)]) + '.npy'
+        if(not os.path.exists(cache_file)):
+            build_cache(data_folder, csv, cache_file, num_thresholded, intensities, num)
 
-        if(not intensities):
-            self.X = np.array(list(map(lambda x: x[x[:,2].argsort()][-num_thresholded:, :2], self.X)))
-        else:
-            self.X = np.array(list(map(lambda x: x[x[:,2].argsort()][-num_thresholded:], self.X)))
+        self.X = np.load(cache_file, mmap_mode='r')
 
-        self.X = torch.FloatTensor(self.X).cuda()
+        print("MNIST Graphs Loaded")
+        print(self.X.shape)
 
-        # print(self.X.shape)
-        # print(self.X[0])
-        # print("Data Processed")
+        # on cpu the graphs are read from the memory map as they're indexed so the dataset doesn't need to fit in RAM
+        if(torch.device(device).type == 'cuda'):
+            self.X = torch.from_numpy(np.array(self.X)).to(device)
 
     def __len__(self):
         return len(self.X)
 
     def __getitem__(self, idx):
+        if(isinstance(self.X, np.ndarray)):
+            return torch.from_numpy(np.array(self.X[idx]))
         return self.X[idx]
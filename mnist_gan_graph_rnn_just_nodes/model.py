@@ -33,26 +33,60 @@ class Simple_GRU(nn.Module):
         output = self.tanh(self.out2(x))
         return output, hidden
 
+    # generates num_points points for each noise vector, same as calling forward once with init=True then once per point
+    # every step's input is the last step's output so the steps can't be run as one sequence through the GRU,
+    # instead each step is unrolled into one gru_cell per layer, with inp1 and inp2 (no nonlinearity between them)
+    # folded into the first layer's input weights, and the points are stacked into the output once at the end
+    def sample(self, noise, num_points):
+        batch_size_run = noise.shape[0]
+
+        # inp2(inp1(x)) followed by the first layer's input projection is a single linear map of x
+        w_in = self.gru.weight_ih_l0 @ self.inp2.weight @ self.inp1.weight
+        b_in = self.gru.weight_ih_l0 @ (self.inp2.weight @ self.inp1.bias + self.inp2.bias) + self.gru.bias_ih_l0
+
+        hidden = [torch.zeros(batch_size_run, self.hidden_size, device=noise.device) for l in range(self.num_layers)]
+
+        x = noise
+        outs = []
+        for i in range(num_points):
+            for l in range(self.num_layers):
+                if(l == 0):
+                    # the noise goes straight into the GRU on the first step
+                    w_ih, b_ih = (self.gru.weight_ih_l0, self.gru.bias_ih_l0) if i == 0 else (w_in, b_in)
+                else:
+                    w_ih, b_ih = getattr(self.gru, 'weight_ih_l' + str(l)), getattr(self.gru, 'bias_ih_l' + str(l))
+                    x = nn.functional.dropout(x, self.gru.dropout, training=self.training)
+
+                hidden[l] = torch.gru_cell(x, hidden[l], w_ih, getattr(self.gru, 'weight_hh_l' + str(l)), b_ih, getattr(self.gru, 'bias_hh_l' + str(l)))
+                x = hidden[l]
+
+            x = self.leaky_relu(x)
+            x = self.leaky_relu(self.out1(x))
+            x = self.tanh(self.out2(x))
+            outs.append(x)
+
+        return torch.stack(outs, 1)
+
     def initHidden(self, batch=True):
         batch_size_run = self.batch_size if batch else 1
-        return torch.zeros(self.num_layers, batch_size_run, self.hidden_size).cuda()
+        return torch.zeros(self.num_layers, batch_size_run, self.hidden_size, device=next(self.parameters()).device)
 
 class Critic(nn.Module):
-    def __init__(self, input_shape, dropout, batch_size, wgan=False):
+    def __init__(self, input_shape, dropout, batch_size, wgan=False, sort_by=None):
         super(Critic, self).__init__()
         self.batch_size = batch_size
+        self.sort_by = sort_by # node features to order the nodes by before the convolutions, e.g. (0, 1, 2) for x then y then intensity, None to not sort
 
         self.leaky_relu = nn.LeakyReLU(negative_slope=0.2)
         self.max_pool = nn.MaxPool1d(2)
         self.conv1 = nn.Conv1d(input_shape[1], 32, 3, padding=1)
         self.conv2 = nn.Conv1d(32, 64, 3, padding=1)
-        self.out = nn.Linear(64*input_shape[0]/4, 1)
+        self.out = nn.Linear(64*(input_shape[0]//4), 1)
         self.wgan = wgan
         self.sigmoid = nn.Sigmoid()
 
     def forward(self, input):
-        # x = self.sort(input)
-        x = input
+        x = input if self.sort_by is None else self.sort(input)
         x = x.permute(0, 2, 1)
         x = self.max_pool(self.leaky_relu(self.conv1(x)))
         x = self.max_pool(self.leaky_relu(self.conv2(x)))
@@ -63,8 +97,13 @@ class Critic(nn.Module):
         else:
             return self.sigmoid(x)
 
+    # orders each graph's nodes by feature sort_by[0], ties broken by sort_by[1] and so on, for the whole batch at once
     def sort(self, x):
-        s, indx = torch.sort(x[:, :, 0])
-        for i in range(len(x)):
-            x[i] = x[i][indx[i]]
-        return x
+        indx = torch.arange(x.shape[1], device=x.device).expand(x.shape[0], -1)
+
+        # stable sorts from the last key to the first, like np.lexsort
+        for f in reversed(self.sort_by):
+            keys = torch.gather(x[:, :, f], 1, indx)
+            indx = torch.gather(indx, 1, torch.sort(keys, dim=1, stable=True)[1])
+
+        return torch.gather(x, 1, indx.unsqueeze(2).expand(-1, -1, x.shape[2]))
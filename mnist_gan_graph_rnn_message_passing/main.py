@@ -1,5 +1,3 @@
-import setGPU
-
 import torch
 from model import Simple_GRU, Critic
 from graph_dataset_mnist import MNISTGraphDataset
@@ -16,13 +14,23 @@ import matplotlib.cm as cm
 import numpy as np
 
 from os import listdir
-from os.path import isfile, join
+from os.path import isfile, join, dirname, abspath
 import sys
 
+sys.path.append(dirname(dirname(abspath(__file__))))
+
+from graph_gan.device import setup_device
+
 #Have to specify 'name' and 'start_epoch' if True
 LOAD_MODEL = False
 WGAN = True
 
+DEVICE = 'cuda' # or e.g. 'cuda:1', 'cpu' - plain 'cuda' picks a free gpu with setGPU
+NUM_THREADS = 0 # intra-op threads on cpu, 0 means torch default
+NUM_INTEROP_THREADS = 0 # inter-op threads on cpu, 0 means torch default
+
+device = setup_device(DEVICE, NUM_THREADS, NUM_INTEROP_THREADS)
+
 input_size = 2
 output_size = 2
 gru_hidden_size = 100
@@ -36,23 +44,24 @@ lr_disc = 0.0001
 lr_gen = 0.00005
 num_critic = 1
 weight_clipping_limit = 1
+critic_sort_by = None # node features the Critic orders nodes by, e.g. (0, 1) for x then y, None to keep the generated order
 
 torch.manual_seed(4)
 
 #Change to True !!
-X = MNISTGraphDataset(num_thresholded, train=True)
+X = MNISTGraphDataset(num_thresholded, train=True, device=device)
 X_loaded = DataLoader(X, shuffle=True, batch_size=batch_size)
 
 name = "22_wgan"
 
 if(LOAD_MODEL):
     start_epoch = 10
-    G = torch.load("models/" + name + "_G_" + str(start_epoch) + ".pt")
-    D = torch.load("models/" + name + "_D_" + str(start_epoch) + ".pt")
+    G = torch.load("models/" + name + "_G_" + str(start_epoch) + ".pt", map_location=device)
+    D = torch.load("models/" + name + "_D_" + str(start_epoch) + ".pt", map_location=device)
 else:
     start_epoch = 0
-    G = Simple_GRU(input_size, output_size, gen_in_dim, gru_hidden_size, gru_num_layers, dropout, batch_size).cuda()
-    D = Critic((num_thresholded, input_size), dropout, batch_size, wgan=True).cuda()
+    G = Simple_GRU(input_size, output_size, gen_in_dim, gru_hidden_size, gru_num_layers, dropout, batch_size).to(device)
+    D = Critic((num_thresholded, input_size), dropout, batch_size, wgan=True, sort_by=critic_sort_by).to(device)
 
 G_optimizer = optim.Adam(G.parameters(), lr = lr_gen, betas=(0.5, 0.999))
 D_optimizer = optim.Adam(D.parameters(), lr = lr_disc, betas=(0.5, 0.999))
@@ -70,17 +79,9 @@ else:
 def gen(batch=True, noise=0):
     batch_size_run = batch_size if batch else 1
     if(noise == 0):
-        noise = normal_dist.sample((batch_size_run, gen_in_dim)).cuda()
-
-    hidden = G.initHidden(batch)
-
-    out, hidden = G(noise, hidden, init=True, batch=batch)
-    output = out.clone().cuda().view(batch_size_run, 1, input_size)
-    for i in range(num_thresholded-1):
-        out, hidden = G(out, hidden, batch=batch)
-        output = torch.cat((output, out.view(batch_size_run, 1, input_size)), 1)
+        noise = normal_dist.sample((batch_size_run, gen_in_dim)).to(device)
 
-    return output
+    return G.sample(noise, num_thresholded)
 
 def disp_sample_outputs(name, epoch, dlosses, glosses):
     fig = plt.figure(figsize=(10,10))
@@ -115,8 +116,8 @@ def train_D(x):
     D.train()
     D.zero_grad()
 
-    Y_real = torch.ones(x.shape[0], 1).cuda()
-    Y_fake = torch.zeros(batch_size, 1).cuda()
+    Y_real = torch.ones(x.shape[0], 1).to(device)
+    Y_fake = torch.zeros(batch_size, 1).to(device)
 
     D_real_output = D(x)
     D_real_loss = criterion(D_real_output, Y_real)
@@ -140,7 +141,7 @@ def train_G():
     G.train()
     G.zero_grad()
 
-    Y_real = torch.ones(batch_size, 1).cuda()
+    Y_real = torch.ones(batch_size, 1).to(device)
 
     gen_ims = gen()
     D_fake_output = D(gen_ims)
@@ -168,7 +169,7 @@ for i in range(start_epoch, 1000):
     D_loss = 0
     G_loss = 0
     for batch_ndx, x in tqdm(enumerate(X_loaded), total=len(X_loaded)):
-        x = x.cuda()
+        x = x.to(device)
         D_loss += train_D(x)
         if(batch_ndx > 0 and batch_ndx % num_critic == 0):
             G_loss += train_G()
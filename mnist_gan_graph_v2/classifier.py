@@ -1,4 +1,3 @@
-import setGPU
 import torch
 import torchvision
 import torch.nn as nn
@@ -6,18 +5,30 @@ from torch.optim import Adam
 from gcn import GCN_classifier
 from graph_dataset_mnist import MNISTGraphDataset
 
+import sys
+from os.path import dirname, abspath
+sys.path.append(dirname(dirname(abspath(__file__))))
+
+from graph_gan.device import setup_device
+
 batch_size = 128
 num_thresholded = 100
 
+DEVICE = 'cuda' # or e.g. 'cuda:1', 'cpu' - plain 'cuda' picks a free gpu with setGPU
+NUM_THREADS = 0 # intra-op threads on cpu, 0 means torch default
+NUM_INTEROP_THREADS = 0 # inter-op threads on cpu, 0 means torch default
+
+device = setup_device(DEVICE, NUM_THREADS, NUM_INTEROP_THREADS)
+
 transforms = torchvision.transforms.Compose([torchvision.transforms.ToTensor()])
 
-X_test = MNISTGraphDataset(num_thresholded, train=False)
+X_test = MNISTGraphDataset(num_thresholded, train=False, device=device)
 # X_train = MNISTGraphDataset(num_thresholded, train=True)
 
 # X_train_loaded = torch.utils.data.DataLoader(X_train, shuffle=True, batch_size=batch_size)
 X_test_loaded = torch.utils.data.DataLoader(X_test, shuffle=False, batch_size=batch_size)
 
-model = GCN_classifier(3, 256, 10, 0.3)
+model = GCN_classifier(3, 256, 10, 0.3).to(device)
 
 loss_func = nn.CrossEntropyLoss()
 optimizer = Adam(model.parameters(), lr=0.001)
@@ -28,6 +39,7 @@ for e in range(5):
     for i, data in enumerate(X_test_loaded):
         print(i)
         input, labels = data
+        input = input.to(device)
         optimizer.zero_grad()
         outputs = model(input)
         loss = loss_func(outputs, labels)
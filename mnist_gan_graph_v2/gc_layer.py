@@ -26,11 +26,13 @@ class GraphConvolution(Module):
             self.bias.data.uniform_(-stdv, stdv)
 
     def forward(self, input, adj):
-        print(input)
-        print(self.weight)
-        print(adj)
-        support = torch.mm(input, self.weight)
-        output = torch.mm(adj, support)
+        # input (batch, nodes, in_features) with adj (batch, nodes, nodes), or a single unbatched graph
+        if(adj.dim() == 3):
+            support = torch.matmul(input, self.weight)
+            output = torch.bmm(adj, support)
+        else:
+            support = torch.mm(input, self.weight)
+            output = torch.mm(adj, support)
         if self.bias is not None:
             return output + self.bias
         else:
@@ -1,29 +1,29 @@
 import torch
 from torch.utils.data import Dataset
 import numpy as np
+import os
 
-class MNISTGraphDataset(Dataset):
-    def __init__(self, num_thresholded, train=True):
-        if(train):
-            dataset = np.loadtxt('../mnist_dataset/mnist_train.csv', delimiter=',', dtype=np.float32)
-        else:
-            dataset = np.loadtxt('../mnist_dataset/mnist_test.csv', delimiter=',', dtype=np.float32)
-
-        print("MNIST CSV Loaded")
+import sys
+from os.path import dirname, abspath
+sys.path.append(dirname(dirname(abspath(__file__))))
 
-        X_pre = (dataset[:, 1:]-127.5)/255.0
+from graph_gan import load_csv, build_cache
 
-        imrange = np.linspace(-0.5, 0.5, num=28, endpoint=False)
+data_folder = '../mnist_dataset/'
 
-        xs, ys = np.meshgrid(imrange, imrange)
+class MNISTGraphDataset(Dataset):
+    def __init__(self, num_thresholded, train=True, device='cuda'):
+        csv = 'mnist_train' if train else 'mnist_test'
 
-        xs = xs.reshape(-1)
-        ys = ys.reshape(-1)
+        # shares the thresholded graphs cached by the other experiments, written once and memory mapped on later runs
+        cache_file = data_folder + 'cache/' + '_'.join([csv, str(num_thresholded), 'intensities', '-1']) + '.npy'
+        if(not os.path.exists(cache_file)):
+            build_cache(data_folder, csv, cache_file, num_thresholded, True, -1)
 
-        X = np.array(list(map(lambda x: np.array([xs, ys, x]).T, X_pre)))
-        self.X = np.array(list(map(lambda x: x[x[:,2].argsort()][-num_thresholded:], X)))
+        self.X = np.load(cache_file, mmap_mode='r')
 
-        self.Y = torch.tensor(dataset[:, 0]).cuda()
+        # CrossEntropyLoss needs integer class labels, the csv is loaded as float32
+        self.Y = torch.tensor(load_csv(data_folder + csv + '.csv')[:, 0]).long().to(device)
 
         print("Data Processed")
 
@@ -31,4 +31,5 @@ class MNISTGraphDataset(Dataset):
         return len(self.X)
 
     def __getitem__(self, idx):
-        return (self.X[idx], self.Y[idx])
+        # GraphConvolution is in double precision, the graphs are cast as they're read from the memory map
+        return (torch.from_numpy(self.X[idx].astype(np.float64)), self.Y[idx])
@@ -0,0 +1,232 @@
+import torch
+from model import Graph_Generator, Graph_Discriminator, Gaussian_Discriminator
+from profiling import get_process_memory
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from os.path import dirname, abspath
+import sys
+
+sys.path.append(dirname(dirname(abspath(__file__))))
+
+from graph_gan.device import setup_device
+
+
+# times forward + backward of the generator and discriminators over a grid of model sizes, e.g.
+# python benchmark.py --batch-size 16,32 --num-hits 75,100 --gru 0,1 --out bench.json
+
+def main(args):
+    device = setup_device(args.device, args.num_threads, args.num_interop_threads)
+
+    torch.manual_seed(4)
+
+    results = []
+
+    for batch_size, num_hits, hidden_node_size, num_iters, gru, int_diffs in itertools.product(args.batch_size, args.num_hits, args.hidden_node_size, args.num_iters, args.gru, args.int_diffs):
+        config = {'batch_size': batch_size, 'num_hits': num_hits, 'hidden_node_size': hidden_node_size, 'num_iters': num_iters, 'gru': bool(gru), 'int_diffs': bool(int_diffs)}
+
+        for model_name in args.models:
+            model, x = build(args, model_name, batch_size, num_hits, hidden_node_size, num_iters, bool(gru), bool(int_diffs))
+            model = model.to(device)
+            x = x.to(device)
+
+            result = dict(config, model=model_name, **time_model(args, model, x, device))
+            results.append(result)
+
+            print("%s %s: %.1f graphs/s, forward %.2fms, backward %.2fms" % (model_name, str(config), result['graphs_per_s'], result['forward_ms'], result['backward_ms']))
+
+            del model, x
+
+    out = {'device': str(device), 'num_threads': torch.get_num_threads(), 'torch': torch.__version__, 'results': results}
+
+    if(args.out):
+        with open(args.out, 'w') as f:
+            json.dump(out, f, indent=2)
+    else:
+        print(json.dumps(out, indent=2))
+
+
+def build(args, model_name, batch_size, num_hits, hidden_node_size, num_iters, gru, int_diffs):
+    if(model_name == 'G'):
+        model = Graph_Generator(args.node_feat_size, args.fe_hidden_size, args.fe_out_size, args.gru_hidden_size, args.gru_num_layers, num_iters, num_hits, args.dropout, args.leaky_relu_alpha, hidden_node_size=hidden_node_size, int_diffs=int_diffs, gru=gru, factorized=args.factorized_edges, chunk_size=args.chunk_size, knn=args.knn, checkpoint_iters=args.checkpoint_iters, self_loops=not args.no_self_loops)
+        x = torch.randn(batch_size, num_hits, hidden_node_size) * 0.2
+    elif(model_name == 'D'):
+        model = Graph_Discriminator(args.node_feat_size, args.fe_hidden_size, args.fe_out_size, args.gru_hidden_size, args.gru_num_layers, num_iters, num_hits, args.dropout, args.leaky_relu_alpha, hidden_node_size=hidden_node_size, int_diffs=int_diffs, gru=gru, factorized=args.factorized_edges, chunk_size=args.chunk_size, knn=args.knn, checkpoint_iters=args.checkpoint_iters, self_loops=not args.no_self_loops)
+        x = torch.rand(batch_size, num_hits, args.node_feat_size) - 0.5
+    elif(model_name == 'gaussian_D'):
+        model = Gaussian_Discriminator(args.node_feat_size, args.fe_hidden_size, args.fe_out_size, args.gru_hidden_size, args.gru_num_layers, num_iters, num_hits, args.dropout, args.leaky_relu_alpha, kernel_size=args.kernel_size, hidden_node_size=hidden_node_size, int_diffs=int_diffs, gru=gru)
+        x = torch.rand(batch_size, num_hits, args.node_feat_size) - 0.5
+    else:
+        raise ValueError("unknown model " + model_name)
+
+    return model, x
+
+
+# forward time of each stage of the message passing iterations, summed over the iterations
+# the edge network is everything in aggregate(), the node update is fn1 (GRU or MLP layers) and fn2
+class StageTimer():
+    def __init__(self, model):
+        self.times = {}
+        self.recording = False
+
+        if(isinstance(model, Gaussian_Discriminator)):
+            self.wrap(model, 'weights', 'kernel_weights')
+            self.hook(model.fn, 'node_update')
+        else:
+            self.wrap(model, 'aggregate', 'edge_network')
+            for module in (model.fn1 if isinstance(model.fn1, torch.nn.ModuleList) else [model.fn1]):
+                self.hook(module, 'node_update')
+            self.hook(model.fn2, 'node_update')
+
+    def add(self, stage, elapsed):
+        if(self.recording):
+            self.times[stage] = self.times.get(stage, 0) + elapsed
+
+    def wrap(self, model, method, stage):
+        f = getattr(model, method)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            out = f(*args, **kwargs)
+            self.add(stage, time.perf_counter() - start)
+            return out
+
+        setattr(model, method, timed)
+
+    def hook(self, module, stage):
+        starts = []
+        module.register_forward_pre_hook(lambda m, inp: starts.append(time.perf_counter()))
+        module.register_forward_hook(lambda m, inp, out: self.add(stage, time.perf_counter() - starts.pop()))
+
+
+# samples the process RSS in the background, psutil can't give the peak of a window
+class PeakMemory():
+    def __init__(self, device, interval=0.001):
+        self.device = device
+        self.interval = interval
+
+    def __enter__(self):
+        if(self.device.type == 'cuda'):
+            torch.cuda.reset_peak_memory_stats(self.device)
+            self.base = torch.cuda.memory_allocated(self.device)
+            return self
+
+        self.base = get_process_memory()[0]
+        self.peak = self.base
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def sample(self):
+        while(self.running):
+            self.peak = max(self.peak, get_process_memory()[0])
+            time.sleep(self.interval)
+
+    def __exit__(self, *exc):
+        if(self.device.type == 'cuda'):
+            self.peak = torch.cuda.max_memory_allocated(self.device)
+        else:
+            self.running = False
+            self.thread.join()
+            self.peak = max(self.peak, get_process_memory()[0])
+
+    def used(self):
+        return self.peak - self.base
+
+
+def time_model(args, model, x, device):
+    model.train()
+    stages = StageTimer(model)
+
+    def step():
+        start = time.perf_counter()
+        out = model(x)
+        sync(device)
+        forward = time.perf_counter() - start
+
+        stages.recording = False
+
+        start = time.perf_counter()
+        out.mean().backward()
+        sync(device)
+        backward = time.perf_counter() - start
+
+        model.zero_grad(set_to_none=True)
+        return forward, backward
+
+    for i in range(args.warmup):
+        step()
+
+    forward = 0
+    backward = 0
+    with PeakMemory(device) as memory:
+        for i in range(args.reps):
+            stages.recording = True
+            f, b = step()
+            forward += f
+            backward += b
+
+    batch_size = x.shape[0]
+
+    return {
+        'graphs_per_s': batch_size * args.reps / (forward + backward),
+        'forward_ms': forward / args.reps * 1000,
+        'backward_ms': backward / args.reps * 1000,
+        'stages_ms': {stage: t / args.reps * 1000 for stage, t in stages.times.items()},
+        'peak_memory_bytes': memory.used(),
+    }
+
+
+def sync(device):
+    if(device.type == 'cuda'):
+        torch.cuda.synchronize(device)
+
+
+def int_list(s):
+    return [int(v) for v in s.split(',')]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+
+    # swept, comma separated
+    parser.add_argument("--batch-size", type=int_list, default=[16], help="batch sizes")
+    parser.add_argument("--num-hits", type=int_list, default=[75], help="numbers of hits")
+    parser.add_argument("--hidden-node-size", type=int_list, default=[64], help="latent vector sizes of each node")
+    parser.add_argument("--num-iters", type=int_list, default=[1], help="numbers of message passing iterations")
+    parser.add_argument("--gru", type=int_list, default=[1], help="1 for a GRU node update, 0 for an MLP")
+    parser.add_argument("--int-diffs", type=int_list, default=[0], help="1 to include intensity differences in the edge features")
+    parser.add_argument("--models", type=lambda s: s.split(','), default=['G', 'D', 'gaussian_D'], help="models to time out of G, D and gaussian_D")
+
+    parser.add_argument("--node-feat-size", type=int, default=3, help="node feature size")
+    parser.add_argument("--fe-hidden-size", type=int, default=128, help="edge network hidden layer size")
+    parser.add_argument("--fe-out-size", type=int, default=256, help="edge network out size")
+    parser.add_argument("--gru-hidden-size", type=int, default=256, help="GRU hidden size")
+    parser.add_argument("--gru-num-layers", type=int, default=2, help="GRU number of layers")
+    parser.add_argument("--dropout", type=float, default=0.2, help="fraction of dropout")
+    parser.add_argument("--leaky-relu-alpha", type=float, default=0.2, help="leaky relu alpha")
+    parser.add_argument("--kernel-size", type=int, default=10, help="graph convolutional layer kernel size")
+    parser.add_argument("--chunk-size", type=int, default=0, help="number of receiving nodes whose edge messages are computed at a time (0 means all at once)")
+    parser.add_argument("--knn", type=int, default=0, help="number of nearest nodes each node receives messages from (0 means fully connected)")
+    parser.add_argument("--checkpoint-iters", action="store_true", default=False, help="checkpoint each message passing iteration")
+    parser.add_argument("--no-self-loops", action="store_true", default=False, help="don't have each node send a message to itself")
+    parser.add_argument("--factorized-edges", action="store_true", default=False, help="project each node once through the first edge network layer")
+
+    parser.add_argument("--device", type=str, default="cpu", help="device to time on")
+    parser.add_argument("--num-threads", type=int, default=0, help="intra-op threads when running on cpu (0 means torch default)")
+    parser.add_argument("--num-interop-threads", type=int, default=0, help="inter-op threads when running on cpu (0 means torch default)")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed steps before timing")
+    parser.add_argument("--reps", type=int, default=5, help="timed steps per configuration")
+    parser.add_argument("--out", type=str, default="", help="json file to write the results to, printed if not given")
+
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
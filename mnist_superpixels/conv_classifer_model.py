@@ -25,10 +25,10 @@ class Gaussian_Classifier(nn.Module):
         self.fc1 = nn.Linear(hidden_node_size, 50)
         self.fc2 = nn.Linear(50, 10)
 
-        self.mu = Parameter(torch.Tensor(kernel_size, 2).cuda())
-        self.sigma = Parameter(torch.Tensor(kernel_size, 2).cuda())
+        self.mu = Parameter(torch.Tensor(kernel_size, 2))
+        self.sigma = Parameter(torch.Tensor(kernel_size, 2))
 
-        self.kernel_weight = Parameter(torch.Tensor(kernel_size).cuda())
+        self.kernel_weight = Parameter(torch.Tensor(kernel_size))
 
         self.glorot(self.mu)
         self.glorot(self.sigma)
@@ -39,19 +39,9 @@ class Gaussian_Classifier(nn.Module):
         x = F.pad(x, (0,self.hidden_node_size - self.node_size,0,0,0,0))
 
         for i in range(self.iters):
-            x1 = x.repeat(1, 1, self.num_hits).view(batch_size, self.num_hits*self.num_hits, self.hidden_node_size)
-            y = x.repeat(1, self.num_hits, 1)
-
-            u = y[:,:,:2]-x1[:,:,:2]
-            y = self.fn(y)
-            y2 = torch.zeros(y.shape).cuda()
-
-            for j in range(self.kernel_size):
-                w = self.weights(u, j)
-                y2 += w.unsqueeze(-1)*self.kernel_weight[j]*y
-
-            x = torch.sum(y2.view(batch_size, self.num_hits, self.num_hits, self.hidden_node_size), 2)
-            x = x.view(batch_size, self.num_hits, self.hidden_node_size)
+            # x_i <- sum_j w(x_j - x_i) fn(x_j), with the weights of all kernels summed into one per edge first
+            u = x[:, :, :2].unsqueeze(1) - x[:, :, :2].unsqueeze(2)
+            x = torch.bmm(self.weights(u), self.fn(x))
 
         x = F.relu(self.fc1(x))
         x = F.dropout(x, training=self.training)
@@ -62,11 +52,12 @@ class Gaussian_Classifier(nn.Module):
         # print(x)
         return F.log_softmax(x)
 
-    def weights(self, u, j):
-        return torch.exp(torch.sum((u-self.mu[j])**2*self.sigma[j], dim=-1))
+    def weights(self, u):
+        w = torch.exp(torch.sum((u.unsqueeze(-2)-self.mu)**2*self.sigma, dim=-1))
+        return torch.matmul(w, self.kernel_weight)
 
     def initHidden(self, batch_size):
-        return torch.zeros(self.mp_num_layers, batch_size*self.num_hits, self.mp_hidden_size).cuda()
+        return torch.zeros(self.mp_num_layers, batch_size*self.num_hits, self.mp_hidden_size, device=next(self.parameters()).device)
 
     def glorot(self, tensor):
         if tensor is not None:
@@ -1,6 +1,4 @@
-import setGPU
-
-# from profile import profile
+# from profiling import profile
 # from time import sleep
 
 import torch
@@ -20,24 +18,33 @@ from tqdm import tqdm
 
 import os
 from os import listdir
-from os.path import join, isdir
+from os.path import join, isdir, dirname, abspath
 import sys
 import tarfile
 import urllib
 
+sys.path.append(dirname(dirname(abspath(__file__))))
+
+from graph_gan.device import setup_device
+
 import matplotlib.pyplot as plt
 plt.switch_backend('agg')
 import matplotlib.cm as cm
 
 import numpy as np
-torch.cuda.set_device(0)
-
 url = 'http://ls7-www.cs.uni-dortmund.de/cvpr_geometric_dl/mnist_superpixels.tar.gz'
 
 #Have to specify 'name' and 'start_epoch' if True
 LOAD_MODEL = False
 TRAIN=False
 
+DEVICE = 'cuda' # or e.g. 'cuda:1', 'cpu' - plain 'cuda' picks a free gpu with setGPU
+NUM_THREADS = 0 # intra-op threads on cpu, 0 means torch default
+NUM_INTEROP_THREADS = 0 # inter-op threads on cpu, 0 means torch default
+DEBUG = False # autograd anomaly detection, slow
+
+device = setup_device(DEVICE, NUM_THREADS, NUM_INTEROP_THREADS)
+
 node_feat_size = 3 # 2 coords + I
 #edge network params
 fe_hidden_size = 256
@@ -96,11 +103,11 @@ else:
 del onlydirs
 
 torch.manual_seed(4)
-torch.autograd.set_detect_anomaly(True)
+torch.autograd.set_detect_anomaly(DEBUG)
 
 #Change to True !!
-training_data = SuperpixelsDataset(num_hits, train=True)
-testing_data = SuperpixelsDataset(num_hits, train=False)
+training_data = SuperpixelsDataset(num_hits, train=True, device=device)
+testing_data = SuperpixelsDataset(num_hits, train=False, device=device)
 
 # print("loading")
 
@@ -111,10 +118,10 @@ test_dl = DataLoader(testing_data, shuffle=True, batch_size=batch_size)
 
 if(LOAD_MODEL):
     start_epoch = 1000
-    C = torch.load("cmodels/" + name + "/C_" + str(start_epoch) + ".pt")
+    C = torch.load("cmodels/" + name + "/C_" + str(start_epoch) + ".pt", map_location=device)
 else:
     start_epoch = 0
-    C = Gaussian_Classifier(node_feat_size, fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, kernel_size=kernel_size, hidden_node_size=hidden_node_size).cuda()
+    C = Gaussian_Classifier(node_feat_size, fe_hidden_size, fe_out_size, mp_hidden_size, mp_num_layers, num_iters, num_hits, dropout, leaky_relu_alpha, kernel_size=kernel_size, hidden_node_size=hidden_node_size).to(device)
 
 C_optimizer = optim.Adam(C.parameters(), lr = lr, betas=(beta1, 0.999))
 
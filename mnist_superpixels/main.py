@@ -1,39 +1,43 @@
-import setGPU
-
-# from profile import profile
+# from profiling import profile
 # from time import sleep
 
 import torch
 from model import Graph_Generator, Graph_Discriminator, Gaussian_Discriminator
 from superpixels_dataset import SuperpixelsDataset
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, DistributedSampler
+from torch.nn.parallel import DistributedDataParallel
 from torch.distributions.normal import Normal
 from torch.autograd import Variable
 from torch.autograd import grad as torch_grad
 
-from skimage.draw import draw
-
 import torch.optim as optim
 from tqdm import tqdm
 
-import matplotlib.pyplot as plt
-plt.switch_backend('agg')
-import matplotlib.cm as cm
+from matplotlib.figure import Figure
 
 import numpy as np
 
 import os
 from os import listdir
-from os.path import join, isdir
+from os.path import join, isdir, dirname, abspath
 import sys
+import copy
 import tarfile
 import urllib
 
+sys.path.append(dirname(dirname(abspath(__file__))))
+
+from graph_gan.render import draw_graphs, save_grid
+from graph_gan.writer import ArtifactWriter
+from graph_gan.checkpoints import save_checkpoint, latest_checkpoint, rng_state, set_rng_state
+from graph_gan.device import setup_device
+from graph_gan.distributed import init_distributed, cleanup_distributed, rank, local_rank, is_main_process, barrier, mean_over_processes, broadcast_object, gather_objects
+
 #torch.cuda.set_device(0)
 
 url = 'http://ls7-www.cs.uni-dortmund.de/cvpr_geometric_dl/mnist_superpixels.tar.gz'
 
-#Have to specify 'name' and 'start_epoch' if True
+#Resumes from the latest checkpoint in models/<name> if True
 LOAD_MODEL = False
 
 GCNN = True
@@ -45,81 +49,93 @@ INT_DIFFS = True
 GRU = False
 
 def main(args):
+    if(args.distributed):
+        init_distributed()
 
-    torch.manual_seed(4)
-    torch.autograd.set_detect_anomaly(True)
-
-    name = [args.name]
-    if WGAN:
-        name.append('wgan')
-    if GRU:
-        name.append('gru')
-    if GCNN:
-        name.append('gcnn')
-    name.append('num_iters_{}'.format(args.num_iters))
-    name.append('num_critic_{}'.format(args.num_critic))
-    name = '_'.join(name)
-
-    dirs = listdir('.')
-    if('models' not in dirs):
-        os.mkdir('./models')
-    if('losses' not in dirs):
-        os.mkdir('./losses')
-    if('args' not in dirs):
-        os.mkdir('./args')
-    if('figs' not in dirs):
-        os.mkdir('./figs')
-    if('dataset' not in dirs):
-        os.mkdir('./dataset')
-        try:
-            # python2
-            file_tmp = urllib.urlretrieve(url, filename=None)[0]
-        except:
-            # python3
-            file_tmp = urllib.request.urlretrieve(url, filename=None)[0]
-        tar = tarfile.open(file_tmp)
-        tar.extractall('./dataset/')
-
-    del dirs
+    device = setup_device(args.device, args.num_threads, args.num_interop_threads, args.distributed)
 
+    torch.manual_seed(4)
+    # anomaly detection records a traceback for every op and slows every step down, so it's only on with --debug
+    torch.autograd.set_detect_anomaly(args.debug)
+
+    name = run_name(args)
+
+    # with --distributed one process per host makes the folders and downloads the dataset while the rest wait
+    if(local_rank() == 0):
+        dirs = listdir('.')
+        if('models' not in dirs):
+            os.mkdir('./models')
+        if('losses' not in dirs):
+            os.mkdir('./losses')
+        if('args' not in dirs):
+            os.mkdir('./args')
+        if('figs' not in dirs):
+            os.mkdir('./figs')
+        if('dataset' not in dirs):
+            os.mkdir('./dataset')
+            try:
+                # python2
+                file_tmp = urllib.urlretrieve(url, filename=None)[0]
+            except:
+                # python3
+                file_tmp = urllib.request.urlretrieve(url, filename=None)[0]
+            tar = tarfile.open(file_tmp)
+            tar.extractall('./dataset/')
+
+        del dirs
+
+    barrier()
+
+    # rank 0's models/ decides for every process, the other hosts might not share it
     onlydirs = [f for f in listdir('models/') if isdir(join('models/', f))]
-    if (name in onlydirs):
+    if (broadcast_object(name in onlydirs)):
         print("name already used")
-        if(not LOAD_MODEL):
+        if(not (LOAD_MODEL or args.resume)):
             sys.exit()
-    else:
+    elif(is_main_process()):
         os.mkdir('./losses/' + name)
         os.mkdir('./models/' + name)
         os.mkdir('./figs/' + name)
 
     del onlydirs
 
-    f = open("args/" + name + ".txt", "w+")
-    f.write(str(locals()))
-    f.close()
+    if(is_main_process()):
+        f = open("args/" + name + ".txt", "w+")
+        f.write(str(locals()))
+        f.close()
 
     print(name)
 
     #Change to True !!
-    X = SuperpixelsDataset(args.num_hits, train=TRAIN, num=NUM)
+    X = SuperpixelsDataset(args.num_hits, train=TRAIN, num=NUM, device=device)
 
     print("loading")
 
-    X_loaded = DataLoader(X, shuffle=True, batch_size=args.batch_size)
+    if(args.distributed):
+        # each process gets its own shuffled share of every epoch, padded so they all take the same number of D and G steps
+        X_loaded = DataLoader(X, sampler=DistributedSampler(X, shuffle=True, seed=4), batch_size=args.batch_size)
+    else:
+        X_loaded = DataLoader(X, shuffle=True, batch_size=args.batch_size)
 
     print("loaded")
 
-    if(LOAD_MODEL):
-        start_epoch = 141
-        G = torch.load("models/" + name + "/G_" + str(start_epoch) + ".pt")
-        D = torch.load("models/" + name + "/D_" + str(start_epoch) + ".pt")
+    G = Graph_Generator(args.node_feat_size, args.fe_hidden_size, args.fe_out_size, args.gru_hidden_size, args.gru_num_layers, args.num_iters, args.num_hits, args.dropout, args.leaky_relu_alpha, hidden_node_size=args.hidden_node_size, int_diffs=INT_DIFFS, gru=GRU, factorized=args.factorized_edges, chunk_size=args.chunk_size, knn=args.knn, checkpoint_iters=args.checkpoint_iters, self_loops=not args.no_self_loops).to(device)
+    if(GCNN):
+        D = Gaussian_Discriminator(args.node_feat_size, args.fe_hidden_size, args.fe_out_size, args.gru_hidden_size, args.gru_num_layers, args.num_iters, args.num_hits, args.dropout, args.leaky_relu_alpha, kernel_size=args.kernel_size, hidden_node_size=args.hidden_node_size, int_diffs=INT_DIFFS, gru=GRU).to(device)
     else:
-        start_epoch = 0
-        G = Graph_Generator(args.node_feat_size, args.fe_hidden_size, args.fe_out_size, args.gru_hidden_size, args.gru_num_layers, args.num_iters, args.num_hits, args.dropout, args.leaky_relu_alpha, hidden_node_size=args.hidden_node_size, int_diffs=INT_DIFFS, gru=GRU).cuda()
-        if(GCNN):
-            D = Gaussian_Discriminator(args.node_feat_size, args.fe_hidden_size, args.fe_out_size, args.gru_hidden_size, args.gru_num_layers, args.num_iters, args.num_hits, args.dropout, args.leaky_relu_alpha, kernel_size=args.kernel_size, hidden_node_size=args.hidden_node_size, int_diffs=INT_DIFFS, gru=GRU).cuda()
-        else:
-            D = Graph_Discriminator(args.node_feat_size, args.fe_hidden_size, args.fe_out_size, args.gru_hidden_size, args.gru_num_layers, args.num_iters, args.num_hits, args.dropout, args.leaky_relu_alpha, hidden_node_size=args.hidden_node_size, int_diffs=INT_DIFFS, gru=GRU).cuda()
+        D = Graph_Discriminator(args.node_feat_size, args.fe_hidden_size, args.fe_out_size, args.gru_hidden_size, args.gru_num_layers, args.num_iters, args.num_hits, args.dropout, args.leaky_relu_alpha, hidden_node_size=args.hidden_node_size, int_diffs=INT_DIFFS, gru=GRU, factorized=args.factorized_edges, chunk_size=args.chunk_size, knn=args.knn, checkpoint_iters=args.checkpoint_iters, self_loops=not args.no_self_loops).to(device)
+
+    if(args.distributed):
+        # the models start out the same on every process, after that each process draws its own noise and dropout masks
+        torch.manual_seed(4 + rank())
+
+        # gradients through G_parallel and D_parallel are averaged over the processes in backward,
+        # G and D are the same models used directly when a step doesn't update them, to sample and for checkpoints
+        G_parallel = DistributedDataParallel(G)
+        D_parallel = DistributedDataParallel(D)
+    else:
+        G_parallel = G
+        D_parallel = D
 
     if(WGAN):
         G_optimizer = optim.RMSprop(G.parameters(), lr = args.lr_gen)
@@ -128,6 +144,49 @@ def main(args):
         G_optimizer = optim.Adam(G.parameters(), lr = args.lr_gen, betas=(args.beta1, 0.999))
         D_optimizer = optim.Adam(D.parameters(), lr = args.lr_disc, betas=(args.beta1, 0.999))
 
+    # bf16 autocast works on cpu and cuda without loss scaling, fp16 needs the gradients scaled so they don't underflow
+    amp_dtype = {'fp32': None, 'bf16': torch.bfloat16, 'fp16': torch.float16}[args.precision]
+    D_scaler = torch.amp.GradScaler(device.type, enabled=(amp_dtype == torch.float16))
+    G_scaler = torch.amp.GradScaler(device.type, enabled=(amp_dtype == torch.float16))
+
+    def autocast():
+        return torch.autocast(device.type, dtype=amp_dtype, enabled=(amp_dtype is not None))
+
+    D_losses = []
+    G_losses = []
+
+    start_epoch = 0
+    state = None
+    if(LOAD_MODEL or args.resume):
+        # only rank 0 reads the checkpoint and sends it to the other processes
+        checkpoint_file = None
+        if(is_main_process()):
+            checkpoint_file = latest_checkpoint("models/" + name)
+            if(checkpoint_file is not None):
+                state = torch.load(checkpoint_file, map_location='cpu' if args.distributed else device)
+
+        checkpoint_file, state = broadcast_object((checkpoint_file, state))
+
+        if(checkpoint_file is None):
+            print("no checkpoint to resume from in models/" + name)
+            # --resume starts the run over instead
+            if(not args.resume):
+                sys.exit()
+
+    if(state is not None):
+        G.load_state_dict(state['G'])
+        D.load_state_dict(state['D'])
+        G_optimizer.load_state_dict(state['G_optimizer'])
+        D_optimizer.load_state_dict(state['D_optimizer'])
+        G_scaler.load_state_dict(state['G_scaler'])
+        D_scaler.load_state_dict(state['D_scaler'])
+
+        D_losses = state['D_losses']
+        G_losses = state['G_losses']
+        start_epoch = state['epoch']
+
+        print("resuming from " + checkpoint_file)
+
     normal_dist = Normal(0, 0.2)
 
     def wasserstein_loss(y_out, y_true):
@@ -143,60 +202,48 @@ def main(args):
 
     # print(criterion(torch.tensor([1.0]),torch.tensor([-1.0])))
 
-    def gen(num_samples, noise=0):
+    def gen(num_samples, noise=0, model=None):
         if(noise == 0):
-            noise = normal_dist.sample((num_samples, args.num_hits, args.hidden_node_size)).cuda()
+            noise = normal_dist.sample((num_samples, args.num_hits, args.hidden_node_size)).to(device)
+
+        if(model is None):
+            model = G
 
         x = noise
         del noise
 
-        x = G(x)
+        x = model(x)
         return x
 
-    def draw_graph(graph, node_r, im_px):
-        imd = im_px + node_r
-        img = np.zeros((imd, imd), dtype=np.float)
-
-        circles = []
-        for node in graph:
-            circles.append((draw.circle_perimeter(int(node[1]), int(node[0]), node_r), draw.circle(int(node[1]), int(node[0]), node_r), node[2]))
-
-        for circle in circles:
-            img[circle[1]] = circle[2]
-
-        return img
+    # figures and models are written on a background thread, only the snapshots are taken here
+    writer = ArtifactWriter()
 
     def save_sample_outputs(name, epoch, dlosses, glosses):
-        fig = plt.figure(figsize=(10,10))
+        if(not is_main_process()):
+            return
 
         num_ims = 100
-        node_r = 30
-        im_px = 1000
 
-        gen_out = gen(args.batch_size).cpu().detach().numpy()
+        with torch.no_grad():
+            gen_out = gen(num_ims).cpu().numpy()
 
-        for i in range(int(num_ims/args.batch_size)):
-            gen_out = np.concatenate((gen_out, gen(args.batch_size).cpu().detach().numpy()), 0)
+        print("Epoch: " + str(epoch))
 
-        gen_out = gen_out[:num_ims]
+        writer.submit(write_sample_outputs, name, epoch, gen_out, list(dlosses), list(glosses))
+
+    def write_sample_outputs(name, epoch, gen_out, dlosses, glosses):
+        node_r = 30
+        im_px = 1000
 
         gen_out[gen_out > 0.47] = 0.47
         gen_out[gen_out < -0.5] = -0.5
 
         gen_out = gen_out*[im_px, im_px, 1] + [(im_px+node_r)/2, (im_px+node_r)/2, 0.55]
 
-        for i in range(1, num_ims+1):
-            fig.add_subplot(10, 10, i)
-            im_disp = draw_graph(gen_out[i-1], node_r, im_px)
-            plt.imshow(im_disp, cmap=cm.gray_r, interpolation='nearest')
-            plt.axis('off')
-
-        print("Epoch: " + str(epoch))
+        save_grid("figs/" + name + "/" + str(epoch) + ".png", draw_graphs(gen_out, node_r, im_px))
 
-        plt.savefig("figs/" +name + "/" + str(epoch) + ".png")
-        plt.close()
-
-        fig = plt.figure()
+        # pyplot isn't thread safe, figures are made directly
+        fig = Figure()
         ax1 = fig.add_subplot(1, 2, 1)
         ax1.plot(dlosses)
         ax1.set_title('Discriminator')
@@ -204,33 +251,69 @@ def main(args):
         ax2.plot(glosses)
         ax2.set_title('Generator')
 
-        plt.savefig("losses/"+ name +"/"+ str(epoch) + ".png")
-        plt.close()
+        fig.savefig("losses/"+ name +"/"+ str(epoch) + ".png")
+
+    # saved in each checkpoint so it's known which mode produced it
+    run_info = {'debug': args.debug, 'precision': args.precision, 'device': str(device), 'torch': str(torch.__version__)}
 
     def save_models(name, epoch):
-        torch.save(G, "models/" + name + "/G_" + str(epoch) + ".pt")
-        torch.save(D, "models/" + name + "/D_" + str(epoch) + ".pt")
+        # a distributed checkpoint has every process's rng state, indexed by rank
+        rng = gather_objects(rng_state()) if args.distributed else rng_state()
+
+        if(not is_main_process()):
+            return
+
+        # everything is copied so training can carry on while the writer thread saves it
+        state = copy.deepcopy({
+            'epoch': epoch,
+            'G': G.state_dict(),
+            'D': D.state_dict(),
+            'G_optimizer': G_optimizer.state_dict(),
+            'D_optimizer': D_optimizer.state_dict(),
+            'G_scaler': G_scaler.state_dict(),
+            'D_scaler': D_scaler.state_dict(),
+            'rng': rng,
+            'D_losses': D_losses,
+            'G_losses': G_losses,
+            'run_info': run_info,
+        })
+
+        writer.submit(save_checkpoint, "models/" + name, epoch, state, args.keep_last, args.keep_every)
+
+    D_grad_norms = []
+    G_grad_norms = []
+
+    # debug mode checks
+    def check_finite(loss_name, loss):
+        if(not torch.isfinite(loss).all()):
+            raise RuntimeError(loss_name + " is " + str(loss.item()))
+
+    def grad_norm(model):
+        return torch.norm(torch.stack([p.grad.detach().norm() for p in model.parameters() if p.grad is not None])).item()
 
     #from https://github.com/EmilienDupont/wgan-gp
     def gradient_penalty(real_data, generated_data):
         batch_size = real_data.size()[0]
 
         # Calculate interpolation
-        alpha = torch.rand(batch_size, 1, 1)
-        alpha = alpha.expand_as(real_data).cuda()
+        alpha = torch.rand(batch_size, 1, 1, device=device)
+        alpha = alpha.expand_as(real_data)
         interpolated = alpha * real_data.data + (1 - alpha) * generated_data.data
-        interpolated = Variable(interpolated, requires_grad=True).cuda()
+        interpolated = Variable(interpolated, requires_grad=True).to(device)
 
         del alpha
-        torch.cuda.empty_cache()
+        if(device.type == 'cuda'):
+            torch.cuda.empty_cache()
 
         # Calculate probability of interpolated examples
-        prob_interpolated = D(interpolated)
+        with autocast():
+            prob_interpolated = D(interpolated)
 
         # Calculate gradients of probabilities with respect to examples
-        gradients = torch_grad(outputs=prob_interpolated, inputs=interpolated, grad_outputs=torch.ones(prob_interpolated.size()).cuda(), create_graph=True, retain_graph=True, allow_unused=True)[0].cuda()
+        # with loss scaling the gradients are taken of the scaled output and unscaled after, the rest is done in fp32
+        gradients = torch_grad(outputs=D_scaler.scale(prob_interpolated.float()), inputs=interpolated, grad_outputs=torch.ones(prob_interpolated.size()).to(device), create_graph=True, retain_graph=True, allow_unused=True)[0].to(device)
 
-        gradients = gradients.contiguous()
+        gradients = gradients.float().contiguous() / D_scaler.get_scale()
 
         # Gradients have shape (batch_size, num_channels, img_width, img_height),
         # so flatten to easily take norm per example in batch
@@ -250,12 +333,15 @@ def main(args):
         run_batch_size = x.shape[0]
 
         if(not WGAN):
-            Y_real = torch.ones(run_batch_size, 1).cuda()
-            Y_fake = torch.zeros(run_batch_size, 1).cuda()
+            Y_real = torch.ones(run_batch_size, 1).to(device)
+            Y_fake = torch.zeros(run_batch_size, 1).to(device)
 
-        D_real_output = D(x)
-        gen_ims = gen(run_batch_size)
-        D_fake_output = D(gen_ims)
+        with autocast():
+            D_real_output = D_parallel(x).float()
+            # G isn't updated in this step so nothing is kept for its backward
+            with torch.no_grad():
+                gen_ims = gen(run_batch_size)
+            D_fake_output = D_parallel(gen_ims).float()
 
         if(WGAN):
             D_loss = D_fake_output.mean() - D_real_output.mean() + gradient_penalty(x, gen_ims)
@@ -265,8 +351,17 @@ def main(args):
 
             D_loss = D_real_loss + D_fake_loss
 
-        D_loss.backward()
-        D_optimizer.step()
+        if(args.debug):
+            check_finite("D loss", D_loss)
+
+        D_scaler.scale(D_loss).backward()
+
+        if(args.debug):
+            D_scaler.unscale_(D_optimizer)
+            D_grad_norms.append(grad_norm(D))
+
+        D_scaler.step(D_optimizer)
+        D_scaler.update()
 
         return D_loss.item()
 
@@ -275,52 +370,90 @@ def main(args):
         G_optimizer.zero_grad()
 
         if(not WGAN):
-            Y_real = torch.ones(args.batch_size, 1).cuda()
-
-        gen_ims = gen(args.batch_size)
+            Y_real = torch.ones(args.batch_size, 1).to(device)
 
-        D_fake_output = D(gen_ims)
+        with autocast():
+            gen_ims = gen(args.batch_size, model=G_parallel)
+            # D isn't updated in this step so its gradients aren't averaged over the processes
+            D_fake_output = D(gen_ims).float()
 
         if(WGAN):
             G_loss = -D_fake_output.mean()
         else:
             G_loss = criterion(D_fake_output, Y_real)
 
-        G_loss.backward()
-        G_optimizer.step()
+        if(args.debug):
+            check_finite("G loss", G_loss)
 
-        return G_loss.item()
+        G_scaler.scale(G_loss).backward()
 
-    D_losses = []
-    G_losses = []
+        if(args.debug):
+            G_scaler.unscale_(G_optimizer)
+            G_grad_norms.append(grad_norm(G))
+
+        G_scaler.step(G_optimizer)
+        G_scaler.update()
+
+        return G_loss.item()
 
     # save_models(name, 0)
 
-    save_sample_outputs(name, 0, D_losses, G_losses)
+    if(start_epoch == 0):
+        save_sample_outputs(name, 0, D_losses, G_losses)
+    else:
+        # the checkpoint's rng state is restored last so the resumed run carries on exactly where it was saved
+        set_rng_state(state['rng'][rank()] if isinstance(state['rng'], list) else state['rng'])
 
     # @profile
     def train():
         for i in range(start_epoch, args.num_epochs):
             print("Epoch %d %s" % ((i+1), name))
+            if(args.distributed):
+                X_loaded.sampler.set_epoch(i)
+
             D_loss = 0
             G_loss = 0
-            for batch_ndx, x in tqdm(enumerate(X_loaded), total=len(X_loaded)):
+            for batch_ndx, x in tqdm(enumerate(X_loaded), total=len(X_loaded), disable=not is_main_process()):
                 if(batch_ndx > 0 and batch_ndx % (args.num_critic+1) == 0):
                     G_loss += train_G()
                 else:
-                    D_loss += train_D(x[0].cuda())
+                    D_loss += train_D(x[0].to(device))
+
+            # every process keeps the loss history averaged over all of them
+            D_losses.append(mean_over_processes(D_loss)/len(X_loaded)/2)
+            G_losses.append(mean_over_processes(G_loss)/len(X_loaded))
 
-            D_losses.append(D_loss/len(X_loaded)/2)
-            G_losses.append(G_loss/len(X_loaded))
+            if(args.debug):
+                print("D grad norm mean %.4g max %.4g" % (np.mean(D_grad_norms), np.max(D_grad_norms)))
+                if(len(G_grad_norms)):
+                    print("G grad norm mean %.4g max %.4g" % (np.mean(G_grad_norms), np.max(G_grad_norms)))
+                D_grad_norms.clear()
+                G_grad_norms.clear()
 
             save_sample_outputs(name, i+1, D_losses, G_losses)
 
-            if((i+1)%5==0):
+            # the last epoch is always saved so a finished run's checkpoint has all of its losses
+            if((i+1)%5==0 or i+1 == args.num_epochs):
                 save_models(name, i+1)
 
     train()
+    writer.close()
+    cleanup_distributed()
 
-def parse_args():
+def run_name(args):
+    name = [args.name]
+    if WGAN:
+        name.append('wgan')
+    if GRU:
+        name.append('gru')
+    if GCNN:
+        name.append('gcnn')
+    name.append('num_iters_{}'.format(args.num_iters))
+    name.append('num_critic_{}'.format(args.num_critic))
+    return '_'.join(name)
+
+# argv defaults to the command line, sweep.py passes each run's own
+def parse_args(argv=None):
     import argparse
 
     parser = argparse.ArgumentParser()
@@ -339,12 +472,30 @@ def parse_args():
     parser.add_argument("--num-iters", type=int, default=1, help="number of discriminator updates for each generator update")
     parser.add_argument("--hidden-node-size", type=int, default=64, help="latent vector size of each node (incl node feature size)")
     parser.add_argument("--kernel-size", type=int, default=10, help="graph convolutional layer kernel size")
+    parser.add_argument("--chunk-size", type=int, default=0, help="number of receiving nodes whose edge messages are computed at a time, bounds peak edge network memory (0 means all at once)")
+    parser.add_argument("--knn", type=int, default=0, help="number of nearest nodes each node receives messages from, graph is rebuilt every iteration (0 means fully connected)")
+    parser.add_argument("--checkpoint-iters", action="store_true", default=False, help="checkpoint each message passing iteration and recompute its edge activations in backward, bounds memory as num_iters grows")
+    parser.add_argument("--factorized-edges", action="store_true", default=False, help="project each node once through the first edge network layer instead of building the full pair tensor")
+    parser.add_argument("--no-self-loops", action="store_true", default=False, help="don't have each node send a message to itself")
+
+    parser.add_argument("--device", type=str, default="cuda", help="device to train on, e.g. cuda, cuda:1 or cpu (plain cuda picks a free gpu with setGPU)")
+    parser.add_argument("--num-threads", type=int, default=0, help="intra-op threads when running on cpu (0 means torch default)")
+    parser.add_argument("--num-interop-threads", type=int, default=0, help="inter-op threads when running on cpu (0 means torch default)")
+    parser.add_argument("--distributed", action="store_true", default=False, help="data parallel training over the processes started by torchrun on one or several hosts, with gloo (see graph_gan/distributed.py), --batch-size is per process")
+    parser.add_argument("--precision", type=str, default="fp32", choices=["fp32", "bf16", "fp16"], help="autocast precision of the forward passes, bf16 runs on cpu, fp16 uses loss scaling")
+
+    parser.add_argument("--keep-last", type=int, default=3, help="number of most recent checkpoints kept, older ones are deleted (0 keeps all)")
+    parser.add_argument("--keep-every", type=int, default=50, help="checkpoints of every this many epochs are kept regardless of --keep-last (0 to not keep any extra)")
+
+    parser.add_argument("--resume", action="store_true", default=False, help="carry on from the latest checkpoint of a run with this name if it has one, start it over if it doesn't (LOAD_MODEL without the exit)")
+
+    parser.add_argument("--debug", action="store_true", default=False, help="anomaly detection, nan/inf checks on the losses and gradient norm logging, all slow")
 
     parser.add_argument("--batch-size", type=int, default=16, help="batch size")
     parser.add_argument("--gp-weight", type=float, default=10, help="WGAN generator penalty weight")
     parser.add_argument("--beta1", type=float, default=0.5, help="Adam optimizer beta1")
     parser.add_argument("--name", type=str, default="41", help="name or tag for model; will be appended with other info")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     return args
 
 
@@ -1,4 +1,4 @@
-# profile.py
+# profiling.py
 import time
 import os
 import psutil
@@ -0,0 +1,229 @@
+import torch
+from main import parse_args, run_name
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+from os.path import join, isdir, abspath, dirname, basename, splitext
+import random
+import subprocess
+import sys
+import time
+
+sys.path.append(dirname(dirname(abspath(__file__))))
+
+from graph_gan.checkpoints import latest_checkpoint
+
+
+# Runs a grid or random search over main.py's options as many small concurrent runs, each on its own cores, e.g.
+# python sweep.py lr_sweep.json --threads-per-run 2
+# with lr_sweep.json
+#   {"search": "grid", "params": {"lr_disc": [1e-5, 1e-4], "num_critic": [1, 2]}, "fixed": {"num_epochs": 50}}
+# or for a random search of num_runs runs, params can also be {"uniform": [low, high]} or {"log_uniform": [low, high]}
+#   {"search": "random", "num_runs": 16, "seed": 0, "params": {"lr_disc": {"log_uniform": [1e-5, 1e-3]}, "dropout": [0.1, 0.2, 0.3]}}
+# Keys are main.py's options with underscores, true/false for its on/off flags
+# Run from the mnist_superpixels folder, the runs are written to models/, losses/ and figs/ as <sweep name>_<run number>_...
+# and the sweep's runs.json, run logs and results.csv to sweeps/<sweep name>/
+# Running the same command again resumes the sweep: finished runs are skipped, the rest carry on from their last checkpoint
+
+# set by the sweep for every run
+RESERVED = ['name', 'device', 'num_threads', 'num_interop_threads', 'resume', 'distributed']
+
+
+def main(args):
+    with open(args.spec) as f:
+        spec = json.load(f)
+
+    name = args.name if args.name else splitext(basename(args.spec))[0]
+    sweep_dir = join('sweeps', name)
+
+    if(not isdir('dataset')):
+        print("no dataset/ here, run main.py once to download it or run the sweep from the mnist_superpixels folder")
+        sys.exit()
+
+    # made up front since runs starting at the same time would race to make them
+    for d in ['models', 'losses', 'args', 'figs', sweep_dir]:
+        os.makedirs(d, exist_ok=True)
+
+    runs_file = join(sweep_dir, 'runs.json')
+    if(os.path.exists(runs_file)):
+        with open(runs_file) as f:
+            runs = json.load(f)
+        print("resuming sweep " + name)
+    else:
+        runs = [{'run': name + '_' + str(i), 'params': params, 'status': 'pending', 'seconds': 0} for i, params in enumerate(configs(spec))]
+
+    # every run's options are checked with main.py's own parser before anything starts
+    for run in runs:
+        run['argv'] = run_argv(run['run'], dict(spec.get('fixed', {}), **run['params']))
+        run['run_name'] = run_name(parse_args(run['argv']))
+
+    todo = [run for run in runs if run['status'] == 'pending' or run['status'] == 'running' or (args.retry_failed and run['status'] == 'failed')]
+
+    slots = core_slots(args.cores, args.threads_per_run)
+    print("%d runs, %d to go, %d at a time on %d threads each" % (len(runs), len(todo), len(slots), args.threads_per_run))
+
+    if(args.dry_run):
+        for run in todo:
+            print(' '.join(run['argv']))
+        return
+
+    save_runs(runs_file, runs)
+
+    running = {}
+    free = list(range(len(slots)))
+
+    try:
+        while(len(todo) or len(running)):
+            while(len(todo) and len(free)):
+                run = todo.pop(0)
+                slot = free.pop(0)
+                running[slot] = (run, start(run, slots[slot], args.threads_per_run, sweep_dir), time.time())
+                run['status'] = 'running'
+                save_runs(runs_file, runs)
+                print("started %s on cores %s" % (run['run'], ','.join(str(c) for c in slots[slot])))
+
+            time.sleep(args.poll)
+
+            for slot, (run, process, started) in list(running.items()):
+                if(process.poll() is None):
+                    continue
+
+                run['seconds'] += time.time() - started
+                run['status'] = 'done' if process.returncode == 0 else 'failed'
+                save_runs(runs_file, runs)
+                print("%s %s after %.0fs" % (run['run'], run['status'], run['seconds']))
+
+                del running[slot]
+                free.append(slot)
+    finally:
+        # on ctrl-c the running runs are stopped and left 'running', so the next sweep resumes them
+        for slot, (run, process, started) in running.items():
+            process.terminate()
+            process.wait()
+            run['seconds'] += time.time() - started
+        save_runs(runs_file, runs)
+
+        write_results(join(sweep_dir, 'results.csv'), runs, spec)
+
+
+def configs(spec):
+    params = spec['params']
+
+    if(spec['search'] == 'grid'):
+        keys = list(params.keys())
+        return [dict(zip(keys, values)) for values in itertools.product(*[params[key] for key in keys])]
+
+    if(spec['search'] == 'random'):
+        rng = random.Random(spec.get('seed', 0))
+        return [{key: sample(rng, value) for key, value in params.items()} for i in range(spec['num_runs'])]
+
+    raise ValueError("unknown search " + spec['search'] + ", it should be grid or random")
+
+
+def sample(rng, value):
+    if(isinstance(value, list)):
+        return rng.choice(value)
+    if('uniform' in value):
+        return rng.uniform(*value['uniform'])
+    if('log_uniform' in value):
+        low, high = value['log_uniform']
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+
+    raise ValueError("unknown distribution " + str(value))
+
+
+def run_argv(run, params):
+    argv = ['--name', run]
+
+    for key, value in params.items():
+        if(key in RESERVED):
+            raise ValueError(key + " is set by the sweep")
+
+        flag = '--' + key.replace('_', '-')
+        if(isinstance(value, bool)):
+            if(value):
+                argv.append(flag)
+        else:
+            argv += [flag, str(value)]
+
+    return argv
+
+
+def core_slots(cores, threads_per_run):
+    # the cores this process may run on, split into one group of threads_per_run cores for each concurrent run
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    if(cores > 0):
+        available = available[:cores]
+
+    num_slots = max(1, len(available) // threads_per_run)
+    return [available[i*threads_per_run:(i+1)*threads_per_run] for i in range(num_slots)]
+
+
+def start(run, cores, threads_per_run, sweep_dir):
+    # the thread pools are sized to the run's cores, any library that ignores torch's settings still reads the environment
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads_per_run), MKL_NUM_THREADS=str(threads_per_run))
+
+    # with --resume a run an earlier sweep didn't finish carries on from its last checkpoint, and a new one just starts
+    argv = [sys.executable, join(dirname(abspath(__file__)), 'main.py')] + run['argv'] + ['--device', 'cpu', '--num-threads', str(threads_per_run), '--num-interop-threads', '1', '--resume']
+
+    # pinned to its own cores so the runs don't move around and compete for the same ones
+    preexec_fn = (lambda: os.sched_setaffinity(0, cores)) if hasattr(os, 'sched_setaffinity') else None
+
+    log = open(join(sweep_dir, run['run'] + '.log'), 'a')
+    process = subprocess.Popen(argv, stdout=log, stderr=subprocess.STDOUT, env=env, preexec_fn=preexec_fn)
+    log.close()
+
+    return process
+
+
+def save_runs(runs_file, runs):
+    # written to a temporary file and renamed like the checkpoints, argv and run_name are rebuilt from the spec every time
+    with open(runs_file + '.tmp', 'w') as f:
+        json.dump([{key: run[key] for key in ['run', 'params', 'status', 'seconds']} for run in runs], f, indent=2)
+    os.replace(runs_file + '.tmp', runs_file)
+
+
+def write_results(results_file, runs, spec):
+    keys = list(spec['params'].keys())
+
+    with open(results_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['run', 'status', 'epochs', 'D_loss', 'G_loss', 'min_G_loss', 'seconds'] + keys)
+
+        for run in runs:
+            epochs, D_losses, G_losses = 0, [], []
+
+            checkpoint_file = latest_checkpoint(join('models', run['run_name'])) if isdir(join('models', run['run_name'])) else None
+            if(checkpoint_file is not None):
+                state = torch.load(checkpoint_file, map_location='cpu')
+                epochs, D_losses, G_losses = state['epoch'], state['D_losses'], state['G_losses']
+
+            writer.writerow([run['run'], run['status'], epochs,
+                             D_losses[-1] if len(D_losses) else '', G_losses[-1] if len(G_losses) else '', min(G_losses) if len(G_losses) else '',
+                             round(run['seconds'])] + [run['params'][key] for key in keys])
+
+    print("results in " + results_file)
+
+
+def parse_sweep_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("spec", type=str, help="json file with the search spec")
+    parser.add_argument("--name", type=str, default="", help="name of the sweep, the spec's file name if not given")
+    parser.add_argument("--threads-per-run", type=int, default=1, help="cores and torch threads given to each run")
+    parser.add_argument("--cores", type=int, default=0, help="number of cores to use (0 means every core this process may run on)")
+    parser.add_argument("--retry-failed", action="store_true", default=False, help="also run failed runs again, from their last checkpoint")
+    parser.add_argument("--poll", type=float, default=5, help="seconds between checks for finished runs")
+    parser.add_argument("--dry-run", action="store_true", default=False, help="print the runs' main.py options without running them")
+
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_sweep_args()
+    main(args)